@@ -9,6 +9,11 @@ if [[ ! -z "${REDIS_URL}" ]]; then
     done
 fi
 
+if [[ ! -z "${PROMETHEUS_MULTIPROC_DIR}" ]]; then
+    rm -rf "${PROMETHEUS_MULTIPROC_DIR}"
+    mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
+fi
+
 until flask db upgrade
 do
     echo "Waiting for postgres server to become available..."
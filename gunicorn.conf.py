@@ -20,3 +20,11 @@ access_log_format = os.getenv(
 errorlog = os.getenv("GUNICORN_ERROR_LOG", "-")
 loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
 logconfig = os.getenv("GUNICORN_LOG_CONFIG", None)
+
+
+# Metrics
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -32,6 +32,61 @@ app.config["LANGUAGES"] = ["en", "de"]
 app.config["SERVER_NAME"] = os.getenv("SERVER_NAME")
 app.config["FLASK_DEBUG"] = getenv_bool("FLASK_DEBUG", "False")
 app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(days=180)
+app.config["TEMPLATE_CACHE_SIZE"] = int(os.getenv("TEMPLATE_CACHE_SIZE", "1024"))
+app.config["IMPORT_BATCH_SIZE"] = int(os.getenv("IMPORT_BATCH_SIZE", "200"))
+app.config["WRITE_CONCURRENCY"] = int(os.getenv("WRITE_CONCURRENCY", "4"))
+app.config["EVENTCALLY_PER_PAGE"] = int(os.getenv("EVENTCALLY_PER_PAGE", "50"))
+app.config["REFERENCE_CACHE_TTL_DAYS"] = int(os.getenv("REFERENCE_CACHE_TTL_DAYS", "7"))
+app.config["LOG_VERBOSITY"] = os.getenv("LOG_VERBOSITY", "changes")
+app.config["LOG_ENTRY_MAX_CONTEXT_SIZE"] = int(
+    os.getenv("LOG_ENTRY_MAX_CONTEXT_SIZE", "65536")
+)
+app.config["RUN_INTERVAL_MIN"] = int(os.getenv("RUN_INTERVAL_MIN", "60"))
+app.config["RUN_INTERVAL_MAX"] = int(os.getenv("RUN_INTERVAL_MAX", "1440"))
+app.config["RUN_INTERVAL_DEFAULT"] = int(os.getenv("RUN_INTERVAL_DEFAULT", "240"))
+app.config["SCHEDULE_TICK"] = int(os.getenv("SCHEDULE_TICK", "5"))
+app.config["SCHEDULE_CHUNK_SIZE"] = int(os.getenv("SCHEDULE_CHUNK_SIZE", "500"))
+app.config["RUN_LEASE_TTL"] = int(os.getenv("RUN_LEASE_TTL", "120"))
+app.config["RUN_LEASE_QUEUE_TTL"] = int(os.getenv("RUN_LEASE_QUEUE_TTL", "3600"))
+app.config["RUN_RETENTION_DAYS"] = int(os.getenv("RUN_RETENTION_DAYS", "15"))
+app.config["PURGE_BATCH_SIZE"] = int(os.getenv("PURGE_BATCH_SIZE", "5000"))
+app.config["PREVIEW_EVENT_LIMIT"] = int(os.getenv("PREVIEW_EVENT_LIMIT", "25"))
+app.config["PREVIEW_FEED_CACHE_SIZE"] = int(os.getenv("PREVIEW_FEED_CACHE_SIZE", "16"))
+app.config["PREVIEW_FEED_CACHE_TTL"] = int(os.getenv("PREVIEW_FEED_CACHE_TTL", "300"))
+app.config["PREVIEW_RENDER_CACHE_SIZE"] = int(
+    os.getenv("PREVIEW_RENDER_CACHE_SIZE", "5000")
+)
+app.config["RECURRENCE_EXPANSION_LIMIT"] = int(
+    os.getenv("RECURRENCE_EXPANSION_LIMIT", "100")
+)
+app.config["RECURRENCE_EXPANSION_DAYS"] = int(
+    os.getenv("RECURRENCE_EXPANSION_DAYS", "365")
+)
+app.config["EVENTCALLY_POOL_CONNECTIONS"] = int(
+    os.getenv("EVENTCALLY_POOL_CONNECTIONS", "10")
+)
+app.config["EVENTCALLY_POOL_MAXSIZE"] = int(os.getenv("EVENTCALLY_POOL_MAXSIZE", "10"))
+app.config["EVENTCALLY_SESSION_IDLE_TIMEOUT"] = int(
+    os.getenv("EVENTCALLY_SESSION_IDLE_TIMEOUT", "300")
+)
+app.config["EVENTCALLY_METADATA_CACHE_TTL"] = int(
+    os.getenv("EVENTCALLY_METADATA_CACHE_TTL", "3600")
+)
+app.config["TOKEN_REFRESH_MARGIN"] = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+app.config["TOKEN_REFRESH_LOCK_TIMEOUT"] = int(
+    os.getenv("TOKEN_REFRESH_LOCK_TIMEOUT", "30")
+)
+app.config["RUN_CONCURRENCY"] = int(os.getenv("RUN_CONCURRENCY", "1"))
+app.config["ORGANIZATION_CONCURRENCY"] = int(os.getenv("ORGANIZATION_CONCURRENCY", "8"))
+app.config["SHARED_FEED_CACHE_TTL"] = int(os.getenv("SHARED_FEED_CACHE_TTL", "900"))
+app.config["SHARED_FEED_PARSE_CACHE_SIZE"] = int(
+    os.getenv("SHARED_FEED_PARSE_CACHE_SIZE", "8")
+)
+app.config["SHARED_FEED_LOCK_TIMEOUT"] = int(
+    os.getenv("SHARED_FEED_LOCK_TIMEOUT", "120")
+)
+app.config["FEED_SNAPSHOTS"] = getenv_bool("FEED_SNAPSHOTS", "True")
+app.config["CELERY_METRICS_PORT"] = int(os.getenv("CELERY_METRICS_PORT", "0"))
 
 # Proxy handling
 if os.getenv("PREFERRED_URL_SCHEME"):  # pragma: no cover
@@ -138,6 +193,8 @@ def fetch_eventcally_token():
 
 
 def update_token(token, refresh_token=None, access_token=None):
+    from project.token_broker import token_broker
+
     if refresh_token:
         user = User.query.filter(User.refresh_token == refresh_token).first()
     elif access_token:
@@ -146,10 +203,8 @@ def update_token(token, refresh_token=None, access_token=None):
         return
 
     # update old token
-    user.access_token = token["access_token"]
-    user.refresh_token = token.get("refresh_token")
-    user.expires_at = token["expires_at"]
-    db.session.commit()
+    token_broker.store_token(user.id, token)
+    db.session.refresh(user)
 
 
 oauth = OAuth(app)
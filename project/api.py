@@ -1,5 +1,4 @@
 from flask_marshmallow import Marshmallow
-from marshmallow import fields
 
 from project import app
 from project.models import LogEntry, Run
@@ -17,8 +16,10 @@ class LogEntrySchema(SQLAlchemyBaseSchema):
         model = LogEntry
 
     id = marshmallow.auto_field()
+    created_at = marshmallow.auto_field()
     message = marshmallow.auto_field()
     type = marshmallow.auto_field()
+    outcome = marshmallow.auto_field()
     context = marshmallow.auto_field()
 
 
@@ -35,4 +36,5 @@ class RunSchema(SQLAlchemyBaseSchema):
     updated_event_count = marshmallow.auto_field()
     unchanged_event_count = marshmallow.auto_field()
     deleted_event_count = marshmallow.auto_field()
-    log_entries = fields.List(fields.Nested(LogEntrySchema))
+    feed_unchanged = marshmallow.auto_field()
+    metrics = marshmallow.auto_field()
@@ -1,11 +1,16 @@
+import math
+
 from project import app
 from project.json_client import JsonClient, NotFoundError, UnprocessableEntityError
+from project.utils import map_concurrently
 
 
 class ApiClient:
     def __init__(self, json_client: JsonClient):
         self.json_client = json_client
         self.organization_id = None
+        self.max_workers = 1
+        self.per_page = app.config["EVENTCALLY_PER_PAGE"]
 
     def get_categories(self) -> int:
         app.logger.debug("Get categories")
@@ -71,6 +76,13 @@ class ApiClient:
             return self.insert_place(data)
 
         place_id = place["id"]
+
+        if all(place.get(key) == value for key, value in data.items()):
+            app.logger.debug(
+                f"Place {place_id} {name} already exists. No need to update."
+            )
+            return place_id
+
         app.logger.debug(f"Place {place_id} {name} already exists")
         self.update_place(place_id, data)
         return place_id
@@ -90,24 +102,75 @@ class ApiClient:
     def find_events_by_internal_tag(self, tag: str) -> int:
         return self._find_events_by_tag_field("internal_tag", tag)
 
+    def find_events_by_tag_or_internal_tag(self, tag: str) -> list:
+        app.logger.debug(f"Find events by tag or internal tag {tag}")
+        fields = ["tag", "internal_tag"]
+        first_paginations = map_concurrently(
+            lambda field: self._search_events(field, tag, 1), fields, self.max_workers
+        )
+
+        paginations = list()
+        page_requests = list()
+        for field, pagination in zip(fields, first_paginations):
+            page_count = self._get_page_count(pagination)
+
+            if page_count is None:
+                paginations.extend(self._follow_pagination(field, tag, pagination))
+                continue
+
+            paginations.append(pagination)
+            page_requests.extend((field, page) for page in range(2, page_count + 1))
+
+        paginations.extend(
+            map_concurrently(
+                lambda r: self._search_events(r[0], tag, r[1]),
+                page_requests,
+                self.max_workers,
+            )
+        )
+
+        # Events that carry the tag in both fields are returned by both searches
+        events_by_id = dict()
+        for pagination in paginations:
+            for event in pagination["items"]:
+                events_by_id.setdefault(event["id"], event)
+
+        return list(events_by_id.values())
+
     def _find_events_by_tag_field(self, field: str, tag: str) -> int:
         events = list()
-        page = 1
+        pagination = self._search_events(field, tag, 1)
 
-        while True:
-            response = self.json_client.get(
-                f"/organizations/{self.organization_id}/events/search?{field}={tag}&per_page=50&page={page}"
-            )
-            pagination = response.json()
+        for pagination in self._follow_pagination(field, tag, pagination):
             events.extend(pagination["items"])
 
-            if pagination["has_next"]:
-                page += 1
-            else:
-                break
-
         return events
 
+    def _search_events(self, field: str, tag: str, page: int) -> dict:
+        response = self.json_client.get(
+            f"/organizations/{self.organization_id}/events/search?{field}={tag}&per_page={self.per_page}&page={page}"
+        )
+        return response.json()
+
+    def _follow_pagination(self, field: str, tag: str, pagination: dict) -> list:
+        paginations = [pagination]
+
+        while pagination["has_next"]:
+            pagination = self._search_events(field, tag, pagination["page"] + 1)
+            paginations.append(pagination)
+
+        return paginations
+
+    def _get_page_count(self, pagination: dict) -> int:
+        if "pages" in pagination:
+            return pagination["pages"]
+
+        # The server may cap the requested page size
+        if "total" in pagination and pagination.get("per_page"):
+            return math.ceil(pagination["total"] / pagination["per_page"])
+
+        return None
+
     def insert_event(self, data: dict) -> int:
         app.logger.debug(f"Insert event {data['name']}")
 
@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.routing import Map, Rule
+from werkzeug.serving import WSGIRequestHandler, make_server
+from werkzeug.wrappers import Request, Response
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # Benchmarks send thousands of requests, only errors are of interest.
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class FakeEventcally:
+    url_map = Map(
+        [
+            Rule("/feed.ics", endpoint="feed"),
+            Rule("/.well-known/openid-configuration", endpoint="metadata"),
+            Rule("/oauth/token", endpoint="token", methods=["POST"]),
+            Rule("/api/v1/event-categories", endpoint="categories"),
+            Rule(
+                "/api/v1/organizations/<organization_id>/<any(places, organizers):kind>",
+                endpoint="references",
+            ),
+            Rule(
+                "/api/v1/<any(places, organizers):kind>/<int:id>", endpoint="reference"
+            ),
+            Rule(
+                "/api/v1/organizations/<organization_id>/events/search",
+                endpoint="search",
+            ),
+            Rule("/api/v1/organizations/<organization_id>/events", endpoint="events"),
+            Rule("/api/v1/events/<int:id>", endpoint="event"),
+        ]
+    )
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.feed = ""
+        self.events = dict()
+        self.references = {"places": dict(), "organizers": dict()}
+        self.calls = Counter()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._server = make_server(
+            "127.0.0.1", 0, self, threaded=True, request_handler=QuietRequestHandler
+        )
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._thread.join()
+
+    def api_call_count(self) -> int:
+        return sum(c for (endpoint, _), c in self.calls.items() if endpoint != "feed")
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        adapter = FakeEventcally.url_map.bind_to_environ(environ)
+
+        try:
+            endpoint, values = adapter.match()
+            with self._lock:
+                self.calls[(endpoint, request.method)] += 1
+
+            if endpoint not in ("feed", "metadata") and self.latency:
+                time.sleep(self.latency)
+
+            response = getattr(self, f"_handle_{endpoint}")(request, **values)
+        except HTTPException as e:
+            response = e
+
+        return response(environ, start_response)
+
+    def _json(self, data, status: int = 200) -> Response:
+        return Response(json.dumps(data), status=status, mimetype="application/json")
+
+    def _create_id(self) -> int:
+        with self._lock:
+            id = self._next_id
+            self._next_id += 1
+            return id
+
+    def _paginate(self, request: Request, items: list) -> Response:
+        per_page = int(request.args.get("per_page", 50))
+        page = int(request.args.get("page", 1))
+        pages = max(1, -(-len(items) // per_page))
+        return self._json(
+            {
+                "items": items[(page - 1) * per_page : page * per_page],
+                "page": page,
+                "pages": pages,
+                "per_page": per_page,
+                "total": len(items),
+                "has_next": page < pages,
+                "has_prev": page > 1,
+            }
+        )
+
+    def _handle_feed(self, request: Request) -> Response:
+        return Response(self.feed, mimetype="text/calendar")
+
+    def _handle_metadata(self, request: Request) -> Response:
+        return self._json(
+            {
+                "issuer": self.base_url,
+                "token_endpoint": f"{self.base_url}/oauth/token",
+                "authorization_endpoint": f"{self.base_url}/oauth/authorize",
+            }
+        )
+
+    def _handle_token(self, request: Request) -> Response:
+        # Rotates the refresh token like eventcally
+        id = self._create_id()
+        return self._json(
+            {
+                "access_token": f"access{id}",
+                "refresh_token": f"refresh{id}",
+                "token_type": "Bearer",
+                "expires_in": 3600,
+            }
+        )
+
+    def _handle_categories(self, request: Request) -> Response:
+        return self._paginate(request, [{"id": 1, "name": "Other"}])
+
+    def _handle_references(
+        self, request: Request, organization_id: str, kind: str
+    ) -> Response:
+        references = self.references[kind]
+
+        if request.method == "POST":
+            data = json.loads(request.get_data())
+            id = self._create_id()
+            references[id] = dict(data, id=id)
+            return self._json({"id": id}, 201)
+
+        name = request.args.get("name")
+        return self._paginate(
+            request, [r for r in references.values() if r["name"] == name]
+        )
+
+    def _handle_reference(self, request: Request, kind: str, id: int) -> Response:
+        if id not in self.references[kind]:
+            raise NotFound()
+
+        self.references[kind][id].update(json.loads(request.get_data()))
+        return Response(status=204)
+
+    def _handle_search(self, request: Request, organization_id: str) -> Response:
+        args = parse_qs(request.query_string.decode())
+        field, tag = next((f, args[f][0]) for f in ("tag", "internal_tag") if f in args)
+        key = "tags" if field == "tag" else "internal_tags"
+        items = [e for e in self.events.values() if tag in e[key].split(",")]
+        return self._paginate(request, items)
+
+    def _handle_events(self, request: Request, organization_id: str) -> Response:
+        data = json.loads(request.get_data())
+        errors = self._validate_event(data)
+
+        if errors:
+            return self._json({"errors": errors}, 422)
+
+        id = self._create_id()
+        self.events[id] = self._create_event(id, data)
+        return self._json({"id": id}, 201)
+
+    def _handle_event(self, request: Request, id: int) -> Response:
+        if id not in self.events:
+            raise NotFound()
+
+        if request.method == "DELETE":
+            del self.events[id]
+            return Response(status=204)
+
+        data = json.loads(request.get_data())
+        errors = self._validate_event(data)
+
+        if errors:
+            return self._json({"errors": errors}, 422)
+
+        self.events[id] = self._create_event(id, data)
+        return Response(status=204)
+
+    def _validate_event(self, data: dict) -> list:
+        # Like eventcally, references to unknown places or organizers are
+        # rejected
+        return [
+            {"field": field, "message": "Not found"}
+            for field, kind in (("place", "places"), ("organizer", "organizers"))
+            if data[field]["id"] not in self.references[kind]
+        ]
+
+    def _create_event(self, id: int, data: dict) -> dict:
+        event = dict(data, id=id)
+        event["place"] = self.references["places"][data["place"]["id"]]
+        event["organizer"] = self.references["organizers"][data["organizer"]["id"]]
+        return event
@@ -0,0 +1,113 @@
+import datetime
+import random
+
+
+class FeedGenerator:
+    def __init__(
+        self,
+        event_count: int = 1000,
+        allday_ratio: float = 0.2,
+        recurrence_ratio: float = 0.0,
+        timezones: list = None,
+        place_count: int = 50,
+        seed: int = 0,
+    ):
+        self.allday_ratio = allday_ratio
+        self.recurrence_ratio = recurrence_ratio
+        self.timezones = timezones or ["Europe/Berlin"]
+        self.place_count = place_count
+        self.random = random.Random(seed)
+        self.base_date = datetime.date.today()
+        self.events = dict()
+        self._next_number = 0
+
+        for _ in range(event_count):
+            self._add_event()
+
+    def churn(self, ratio: float):
+        uids = list(self.events.keys())
+        count = int(len(uids) * ratio)
+        changed = self.random.sample(uids, count)
+
+        for uid in changed[: count // 2]:
+            self.events[uid]["name"] += " (geändert)"
+
+        for uid in changed[count // 2 :]:
+            del self.events[uid]
+
+        for _ in range(count - count // 2):
+            self._add_event()
+
+    def generate(self) -> str:
+        dtstamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        lines = [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//eventcally//ical importer benchmark//DE",
+            "X-WR-CALNAME:Benchmark",
+        ]
+
+        for uid, event in self.events.items():
+            lines.extend(
+                [
+                    "BEGIN:VEVENT",
+                    f"UID:{uid}",
+                    f"DTSTAMP:{dtstamp}",
+                    *self._get_date_lines(event),
+                    f"SUMMARY:{event['name']}",
+                    f"LOCATION:{event['place_name']}",
+                    f"DESCRIPTION:{event['description']}",
+                    f"URL:https://example.com/events/{uid}",
+                ]
+            )
+
+            if event["recurring"]:
+                lines.append("RRULE:FREQ=WEEKLY;COUNT=10")
+
+            lines.append("END:VEVENT")
+
+        lines.append("END:VCALENDAR")
+        return "\r\n".join(lines) + "\r\n"
+
+    def _add_event(self):
+        number = self._next_number
+        self._next_number += 1
+
+        start = datetime.datetime.combine(
+            self.base_date, datetime.time(hour=self.random.randint(8, 20))
+        ) + datetime.timedelta(days=self.random.randint(-30, 365))
+
+        self.events[f"benchmark-{number}@ical-importer"] = {
+            "name": f"Event {number}",
+            "description": f"Beschreibung von Event {number}",
+            "place_name": f"Ort {self.random.randrange(self.place_count)}",
+            "start": start,
+            "duration": datetime.timedelta(hours=self.random.randint(1, 4)),
+            "allday": self.random.random() < self.allday_ratio,
+            "recurring": self.random.random() < self.recurrence_ratio,
+            "timezone": self.random.choice(self.timezones),
+        }
+
+    def _get_date_lines(self, event: dict) -> list:
+        start = event["start"]
+
+        if event["allday"]:
+            end = start.date() + datetime.timedelta(days=1)
+            return [
+                f"DTSTART;VALUE=DATE:{start.strftime('%Y%m%d')}",
+                f"DTEND;VALUE=DATE:{end.strftime('%Y%m%d')}",
+            ]
+
+        end = start + event["duration"]
+
+        if event["timezone"] == "UTC":
+            return [
+                f"DTSTART:{start.strftime('%Y%m%dT%H%M%SZ')}",
+                f"DTEND:{end.strftime('%Y%m%dT%H%M%SZ')}",
+            ]
+
+        tzid = event["timezone"]
+        return [
+            f"DTSTART;TZID={tzid}:{start.strftime('%Y%m%dT%H%M%S')}",
+            f"DTEND;TZID={tzid}:{end.strftime('%Y%m%dT%H%M%S')}",
+        ]
@@ -0,0 +1,142 @@
+import datetime
+import time
+import tracemalloc
+
+from project import app, db, oauth
+from project.api_client import ApiClient
+from project.benchmark.fake_eventcally import FakeEventcally
+from project.benchmark.feed import FeedGenerator
+from project.ical_importer import IcalImporter
+from project.json_client import JsonClient
+from project.models import Configuration, User
+
+
+class ImporterBenchmark:
+    scenarios = ["initial", "steady", "churn"]
+    custom_templates = {
+        "name": '{{ standard["name"] | upper }}',
+        "description": (
+            '{{ standard["description"] }}'
+            '{% if standard["external_link"] %} ({{ vevent.url }}){% endif %}'
+        ),
+        "tags": "benchmark,{{ standard['start'].year }}",
+    }
+
+    def __init__(
+        self,
+        feed_generator: FeedGenerator,
+        latency: float = 0.0,
+        churn_ratio: float = 0.1,
+        use_custom_templates: bool = False,
+        write_concurrency: int = None,
+        measure_memory: bool = True,
+    ):
+        self.feed_generator = feed_generator
+        self.latency = latency
+        self.churn_ratio = churn_ratio
+        self.use_custom_templates = use_custom_templates
+        self.write_concurrency = write_concurrency
+        self.measure_memory = measure_memory
+        self.server = None
+        self.user = None
+        self.configuration = None
+
+    def run(self, scenarios: list) -> list:
+        self.server = FakeEventcally(self.latency)
+        self.server.start()
+
+        try:
+            self._create_configuration()
+            return [self._run_scenario(scenario) for scenario in scenarios]
+        finally:
+            # Nothing of the benchmark is kept in the database
+            db.session.rollback()
+            self.server.stop()
+
+    def _create_configuration(self):
+        self.user = User(
+            email=f"benchmark-{time.time_ns()}@localhost",
+            token_type="Bearer",
+            access_token="benchmark",
+            refresh_token="benchmark",
+            expires_at=int(time.time()) + 86400,
+        )
+        db.session.add(self.user)
+        db.session.flush()
+
+        self.configuration = Configuration(
+            user_id=self.user.id,
+            title="Benchmark",
+            url=f"{self.server.base_url}/feed.ics",
+            organization_id="1",
+            write_concurrency=self.write_concurrency,
+        )
+
+        if self.use_custom_templates:
+            self.configuration.update_with_kwargs(**ImporterBenchmark.custom_templates)
+
+        db.session.add(self.configuration)
+        db.session.flush()
+
+    def _create_api_client(self) -> ApiClient:
+        oauth_client = oauth.register(
+            f"eventcally_benchmark_{self.server.base_url.rsplit(':', 1)[1]}",
+            client_id="benchmark",
+            client_secret="benchmark",
+            api_base_url=self.server.base_url,
+            server_metadata_url=f"{self.server.base_url}/.well-known/openid-configuration",
+        )
+        return ApiClient(JsonClient(oauth_client, self.user))
+
+    def _run_scenario(self, scenario: str) -> dict:
+        if scenario == "churn":
+            self.feed_generator.churn(self.churn_ratio)
+
+        # A new DTSTAMP changes the feed hash, so every run has to look at
+        # all events.
+        self.server.feed = self.feed_generator.generate()
+        self.configuration.reset_feed_state()
+
+        importer = IcalImporter()
+        importer.dry = False
+        importer.api_client = self._create_api_client()
+        importer.api_client.organization_id = self.configuration.organization_id
+        importer.api_client.max_workers = (
+            self.configuration.write_concurrency or app.config["WRITE_CONCURRENCY"]
+        )
+
+        event_count = len(self.feed_generator.events)
+        api_calls_before = self.server.api_call_count()
+
+        if self.measure_memory:
+            tracemalloc.start()
+
+        started_at = datetime.datetime.utcnow()
+        start = time.perf_counter()
+        importer.perform(self.configuration)
+        db.session.flush()
+        duration = time.perf_counter() - start
+
+        peak_memory = None
+        if self.measure_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        api_calls = self.server.api_call_count() - api_calls_before
+        run = importer.run
+        return {
+            "scenario": scenario,
+            "started_at": started_at.isoformat(),
+            "status": run.status,
+            "events": event_count,
+            "duration": duration,
+            "events_per_second": event_count / duration if duration else None,
+            "api_calls": api_calls,
+            "api_calls_per_event": api_calls / event_count if event_count else None,
+            "peak_memory_mb": peak_memory / 1024 / 1024 if peak_memory else None,
+            "new": run.new_event_count,
+            "updated": run.updated_event_count,
+            "unchanged": run.unchanged_event_count,
+            "deleted": run.deleted_event_count,
+            "failures": run.failure_event_count,
+        }
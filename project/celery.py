@@ -5,7 +5,13 @@ from urllib.error import URLError
 from babel import Locale
 from celery import Celery
 from celery import Task as BaseTask
-from celery.signals import after_setup_logger, after_setup_task_logger, task_postrun
+from celery.signals import (
+    after_setup_logger,
+    after_setup_task_logger,
+    task_postrun,
+    worker_init,
+    worker_process_shutdown,
+)
 from requests.exceptions import RequestException
 
 
@@ -81,6 +87,22 @@ def close_session(*args, **kwargs):
         sqlalchemydb.session.remove()
 
 
+@worker_init.connect
+def start_metrics_exporter(*args, **kwargs):
+    from project import app
+    from project.metrics import start_worker_exporter
+
+    if app.config["CELERY_METRICS_PORT"]:
+        start_worker_exporter(app.config["CELERY_METRICS_PORT"])
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, *args, **kwargs):
+    from project.metrics import mark_process_dead
+
+    mark_process_dead(pid)
+
+
 @contextmanager
 def force_locale(locale=None):
     from project import app
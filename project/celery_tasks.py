@@ -1,12 +1,20 @@
-from celery import group
+import random
+import time
+
+from celery import uuid
 from celery.schedules import crontab
 
-from project import celery
+from project import app, celery
+from project.metrics import observe_run
+from project.run_lease import RunLease
+from project.utils import map_concurrently
 
 
 @celery.on_after_configure.connect
 def setup_periodic_tasks(sender, **kwargs):
-    sender.add_periodic_task(crontab(minute=0, hour="*/4"), schedule_runs_task)
+    sender.add_periodic_task(
+        crontab(minute=f"*/{app.config['SCHEDULE_TICK']}"), schedule_runs_task
+    )
     sender.add_periodic_task(crontab(hour=0, minute=30), delete_outdated_runs_task)
 
 
@@ -15,35 +23,134 @@ def setup_periodic_tasks(sender, **kwargs):
     reject_on_worker_lost=True,
 )
 def schedule_runs_task():
+    import datetime
+
+    from sqlalchemy import func, or_, select, update
+
+    from project import db
     from project.models import Configuration
 
-    configurations = Configuration.query.all()
+    now = datetime.datetime.utcnow()
+    tick = app.config["SCHEDULE_TICK"] * 60
+    chunk_size = app.config["SCHEDULE_CHUNK_SIZE"]
+    countdowns = dict()
+    last_id = 0
+
+    while True:
+        rows = db.session.execute(
+            select(Configuration.id, Configuration.url)
+            .where(
+                Configuration.id > last_id,
+                or_(
+                    Configuration.next_run_at.is_(None),
+                    Configuration.next_run_at <= now,
+                ),
+            )
+            .order_by(Configuration.id)
+            .limit(chunk_size)
+        ).all()
+
+        if not rows:
+            break
+
+        ids = [row.id for row in rows]
+
+        # Keeps the configurations from being dispatched again while their runs
+        # are queued. The run reschedules them when it is done.
+        interval = func.coalesce(
+            Configuration.run_interval, app.config["RUN_INTERVAL_DEFAULT"]
+        )
+        db.session.execute(
+            update(Configuration)
+            .where(Configuration.id.in_(ids))
+            .values(next_run_at=now + func.make_interval(0, 0, 0, 0, 0, interval))
+        )
+        db.session.commit()
+
+        # Spreads the runs across the tick instead of starting them all at once.
+        # Configurations with the same URL start together, so that they share
+        # one download of the feed. They are batched together within a chunk,
+        # batches of different chunks share the download through the feed cache.
+        # Configurations with a queued or running run are skipped.
+        run_concurrency = app.config["RUN_CONCURRENCY"]
+        rows = sorted(rows, key=lambda row: row.url or "")
+
+        for row in rows:
+            countdowns.setdefault(row.url, random.uniform(0, tick))
+
+        for i in range(0, len(rows), run_concurrency):
+            task_id = uuid()
+            batch_rows = rows[i : i + run_concurrency]
+            batch = [row.id for row in batch_rows if RunLease(row.id).claim(task_id)]
+            countdown = countdowns[batch_rows[0].url]
+
+            if not batch:
+                continue
+
+            if run_concurrency > 1:
+                perform_runs_task.apply_async(
+                    (batch,), task_id=task_id, countdown=countdown
+                )
+            else:
+                perform_run_task.apply_async(
+                    (batch[0],), task_id=task_id, countdown=countdown
+                )
+
+        last_id = ids[-1]
 
-    if not configurations:
-        return
 
-    group(perform_run_task.s(c.id) for c in configurations).delay()
+@celery.task(
+    bind=True,
+    acks_late=True,
+    reject_on_worker_lost=True,
+)
+def perform_run_task(self, id):
+    _perform_run(id, self.request.id)
 
 
 @celery.task(
+    bind=True,
     acks_late=True,
     reject_on_worker_lost=True,
 )
-def perform_run_task(id):
+def perform_runs_task(self, ids):
+    # The runs block on HTTP most of the time, so several of them share one
+    # worker process. Each thread has its own app context and session.
+    map_concurrently(
+        lambda id: _perform_run(id, self.request.id),
+        ids,
+        app.config["RUN_CONCURRENCY"],
+    )
+
+
+def _perform_run(id, task_id):
     from project import db
     from project.ical_importer import IcalImporter
     from project.models import Configuration
 
-    configuration = Configuration.query.get(id)
+    lease = RunLease(id)
 
-    if not configuration:
+    if not lease.acquire(task_id):
+        app.logger.info(f"Dropping run of configuration {id}: already in progress")
         return
 
-    importer = IcalImporter()
-    importer.dry = False
-    importer.perform(configuration)
+    try:
+        configuration = Configuration.query.get(id)
+
+        if not configuration:
+            return
+
+        importer = IcalImporter()
+        importer.dry = False
+
+        start = time.perf_counter()
+        importer.perform(configuration)
+        observe_run(importer.run, importer.vevent_count, time.perf_counter() - start)
 
-    db.session.commit()
+        configuration.reschedule(importer.run)
+        db.session.commit()
+    finally:
+        lease.release()
 
 
 @celery.task(
@@ -53,13 +160,49 @@ def perform_run_task(id):
 def delete_outdated_runs_task():
     import datetime
 
-    from project import db
-    from project.models import Run
-
-    due = datetime.datetime.utcnow() - datetime.timedelta(days=15)
-    runs = Run.query.filter(Run.created_at < due).all()
+    from sqlalchemy import delete, exists, func, select
 
-    for run in runs:
-        db.session.delete(run)
-
-    db.session.commit()
+    from project import db
+    from project.models import Configuration, FeedSnapshot, LogEntry, Run
+
+    now = datetime.datetime.utcnow()
+    batch_size = app.config["PURGE_BATCH_SIZE"]
+    retention_days = func.coalesce(
+        Configuration.run_retention_days, app.config["RUN_RETENTION_DAYS"]
+    )
+    outdated_run_ids = (
+        select(Run.id)
+        .join(Configuration, Run.configuration_id == Configuration.id)
+        .where(Run.created_at < now - func.make_interval(0, 0, 0, retention_days))
+    )
+
+    # Feed snapshots are kept as long as a run references them. Recent ones
+    # may belong to a run that is not committed yet.
+    unreferenced_snapshot_hashes = select(FeedSnapshot.hash).where(
+        FeedSnapshot.created_at < now - datetime.timedelta(days=1),
+        ~exists().where(Run.feed_snapshot_hash == FeedSnapshot.hash),
+    )
+
+    # Log entries are purged first in bounded batches, so that deleting a run
+    # does not cascade to an unbounded number of rows in one transaction.
+    batches = [
+        (
+            LogEntry,
+            LogEntry.id,
+            select(LogEntry.id).where(LogEntry.run_id.in_(outdated_run_ids)),
+        ),
+        (Run, Run.id, outdated_run_ids),
+        (FeedSnapshot, FeedSnapshot.hash, unreferenced_snapshot_hashes),
+    ]
+
+    for model, key, keys in batches:
+        while True:
+            result = db.session.execute(
+                delete(model)
+                .where(key.in_(keys.limit(batch_size)))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+
+            if result.rowcount < batch_size:
+                break
@@ -22,4 +22,138 @@ def configuration_run(id: int):
     db.session.commit()
 
 
+@configuration_cli.command("replay")
+@click.argument("run_id", type=int)
+@click.option("--current-settings", is_flag=True, help="Use the current templates")
+@click.option("--profile", is_flag=True, help="Print a cProfile of the replay")
+@click.option("--json", "as_json", is_flag=True, help="Print the log entries")
+def configuration_replay(
+    run_id: int, current_settings: bool, profile: bool, as_json: bool
+):
+    import cProfile
+    import pstats
+
+    from project import db
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration, FeedSnapshot, Run
+
+    run = db.session.get(Run, run_id)
+
+    if not run or not run.feed_snapshot_hash:
+        raise click.ClickException(f"Run {run_id} has no feed snapshot")
+
+    snapshot = db.session.get(FeedSnapshot, run.feed_snapshot_hash)
+    configuration = run.configuration
+
+    if not current_settings:
+        for attr in Configuration._mapper_attrs:
+            if attr in run.configuration_settings:
+                setattr(configuration, attr, run.configuration_settings[attr])
+
+    # A dry run with a given calendar neither downloads the feed nor calls
+    # the eventcally API.
+    importer = IcalImporter()
+    importer.dry = True
+    importer.calendar, importer.calendar_name = importer._parse_calendar(
+        snapshot.get_content()
+    )
+
+    profiler = cProfile.Profile() if profile else None
+
+    if profiler:
+        profiler.enable()
+
+    importer.perform(configuration)
+
+    if profiler:
+        profiler.disable()
+
+    db.session.rollback()
+
+    if as_json:
+        click.echo(app.json.dumps(importer.log_entries))
+    else:
+        result = importer.run
+        click.echo(
+            f"{result.status}: {importer.vevent_count} events, "
+            f"failures {result.failure_event_count} "
+            f"skipped {result.skipped_event_count} "
+            f"new {result.new_event_count} updated {result.updated_event_count} "
+            f"unchanged {result.unchanged_event_count}"
+        )
+
+        for phase, duration in result.metrics["phases"].items():
+            click.echo(f"{phase:<16} {duration:.3f}s")
+
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(30)
+
+
+benchmark_cli = AppGroup("benchmark")
+
+
+@benchmark_cli.command("importer")
+@click.option("--events", default=1000, show_default=True)
+@click.option("--allday-ratio", default=0.2, show_default=True)
+@click.option("--recurrence-ratio", default=0.0, show_default=True)
+@click.option("--timezones", default="Europe/Berlin,UTC", show_default=True)
+@click.option("--custom-templates", is_flag=True)
+@click.option("--latency", default=0.0, show_default=True, help="Seconds per API call")
+@click.option("--concurrency", type=int)
+@click.option("--churn-ratio", default=0.1, show_default=True)
+@click.option("--scenarios", default="initial,steady,churn", show_default=True)
+@click.option("--no-memory", is_flag=True, help="Skip peak memory measurement")
+@click.option("--json", "as_json", is_flag=True)
+def benchmark_importer(
+    events: int,
+    allday_ratio: float,
+    recurrence_ratio: float,
+    timezones: str,
+    custom_templates: bool,
+    latency: float,
+    concurrency: int,
+    churn_ratio: float,
+    scenarios: str,
+    no_memory: bool,
+    as_json: bool,
+):
+    from project.benchmark.feed import FeedGenerator
+    from project.benchmark.runner import ImporterBenchmark
+
+    feed_generator = FeedGenerator(
+        event_count=events,
+        allday_ratio=allday_ratio,
+        recurrence_ratio=recurrence_ratio,
+        timezones=timezones.split(","),
+    )
+    benchmark = ImporterBenchmark(
+        feed_generator,
+        latency=latency,
+        churn_ratio=churn_ratio,
+        use_custom_templates=custom_templates,
+        write_concurrency=concurrency,
+        measure_memory=not no_memory,
+    )
+    results = benchmark.run(scenarios.split(","))
+
+    if as_json:
+        click.echo(app.json.dumps(results))
+        return
+
+    for result in results:
+        peak_memory = result["peak_memory_mb"]
+        click.echo(
+            f"{result['scenario']:<8} {result['status']:<8} "
+            f"{result['events']} events in {result['duration']:.2f}s "
+            f"({result['events_per_second']:.1f}/s), "
+            f"{result['api_calls']} API calls "
+            f"({result['api_calls_per_event']:.2f}/event), "
+            f"peak memory {f'{peak_memory:.1f} MB' if peak_memory else '-'}, "
+            f"new {result['new']} updated {result['updated']} "
+            f"unchanged {result['unchanged']} deleted {result['deleted']} "
+            f"failures {result['failures']}"
+        )
+
+
 app.cli.add_command(configuration_cli)
+app.cli.add_command(benchmark_cli)
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import threading
+import zlib
+
+from project import app
+from project.cache import LRUCache
+
+
+class SharedFeedCache:
+    """Short-lived, content-addressed cache of downloaded feeds.
+
+    Configurations with the same URL share one download: the first run
+    downloads the feed while holding a per-URL lock and stores the content by
+    its hash, the others wait for the lock and read it. With Redis the cache
+    is shared by all processes, otherwise by the threads of a process. Parsed
+    calendars are kept per process by content hash.
+    """
+
+    def __init__(self):
+        self._local = None
+        self._parsed = None
+        self._locks = dict()
+        self._locks_lock = threading.Lock()
+
+    def fetch(self, url: str, request) -> dict:
+        """Returns the feed of the URL as dict with content, hash, etag and
+        last_modified, calling request() on a cache miss."""
+        url_key = f"ical_importer:feed_url:{hashlib.sha256(url.encode()).hexdigest()}"
+        feed = self._load(url_key)
+
+        if feed:
+            return feed
+
+        with self._lock(url_key):
+            feed = self._load(url_key)
+
+            if feed:
+                return feed
+
+            feed = request()
+            self._store(url_key, feed)
+            return feed
+
+    def parse(self, feed: dict, parse) -> tuple:
+        if self._parsed is None:
+            self._parsed = LRUCache(app.config["SHARED_FEED_PARSE_CACHE_SIZE"])
+
+        return self._parsed.get_or_create(feed["hash"], lambda: parse(feed["content"]))
+
+    def _load(self, url_key: str) -> dict:
+        if not app.config["REDIS_URL"]:
+            return self._get_local().get(url_key)
+
+        from project.redis_client import get_redis
+
+        redis = get_redis()
+        meta = redis.get(url_key)
+
+        if not meta:
+            return None
+
+        feed = json.loads(meta)
+        content = redis.get(f"ical_importer:feed:{feed['hash']}")
+
+        if content is None:
+            return None
+
+        feed["content"] = zlib.decompress(content).decode("utf-8")
+        return feed
+
+    def _store(self, url_key: str, feed: dict):
+        ttl = app.config["SHARED_FEED_CACHE_TTL"]
+
+        if not app.config["REDIS_URL"]:
+            self._get_local().set(url_key, feed)
+            return
+
+        from project.redis_client import get_redis
+
+        meta = {k: v for k, v in feed.items() if k != "content"}
+        content = zlib.compress(feed["content"].encode("utf-8"))
+
+        pipeline = get_redis().pipeline()
+        pipeline.set(f"ical_importer:feed:{feed['hash']}", content, ex=ttl)
+        pipeline.set(url_key, json.dumps(meta), ex=ttl)
+        pipeline.execute()
+
+    def _get_local(self) -> LRUCache:
+        if self._local is None:
+            self._local = LRUCache(
+                app.config["SHARED_FEED_PARSE_CACHE_SIZE"],
+                ttl=app.config["SHARED_FEED_CACHE_TTL"],
+            )
+
+        return self._local
+
+    def _lock(self, url_key: str):
+        if app.config["REDIS_URL"]:
+            from project.redis_client import get_redis
+
+            return get_redis().lock(
+                f"{url_key}:lock",
+                timeout=app.config["SHARED_FEED_LOCK_TIMEOUT"],
+                blocking_timeout=app.config["SHARED_FEED_LOCK_TIMEOUT"],
+            )
+
+        with self._locks_lock:
+            return self._locks.setdefault(url_key, threading.Lock())
+
+
+shared_feed_cache = SharedFeedCache()
@@ -1,30 +1,115 @@
 import datetime
+import hashlib
+import time
 import traceback
+import zlib
+from contextlib import contextmanager
 
+import arrow
 import requests
 from ics import Calendar
-from jinja2 import BaseLoader, Environment
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from project import oauth
+from project import app, oauth
 from project.api_client import ApiClient
-from project.json_client import JsonClient
-from project.models import Configuration, ImportedEvent, LogEntry, Run
+from project.cache import LRUCache
+from project.feed_cache import shared_feed_cache
+from project.json_client import (
+    JsonClient,
+    UnprocessableEntityError,
+    get_organization_semaphore,
+)
+from project.metrics import observe_feed_download
+from project.models import Configuration, FeedSnapshot, ImportedEvent, LogEntry, Run
+from project.recurrence import (
+    create_recurrence_rule,
+    expand_recurrence_rule,
+    is_native_recurrence_rule,
+    recurrence_line_names,
+    validate_recurrence_rule,
+)
+from project.reference_cache import ReferenceCache
+from project.template_cache import MappingTemplate, template_cache
+from project.utils import map_concurrently
+
+# Parsed calendars by URL, so that iterating on templates in the preview does
+# not download and parse the feed on every click.
+preview_feed_cache = LRUCache(
+    app.config["PREVIEW_FEED_CACHE_SIZE"], ttl=app.config["PREVIEW_FEED_CACHE_TTL"]
+)
+
+# Rendered template values by (template, VEVENT, field), so that editing one
+# field in the preview only renders that field again.
+preview_render_cache = LRUCache(app.config["PREVIEW_RENDER_CACHE_SIZE"])
 
 
 class IcalImporter:
     required_keys = ["name", "organizer_name", "place_name", "start"]
     tag_configuration_prefix = "ical-importer-cfg-"
     tag_vevent_prefix = "ical-importer-vevent-"
+    log_entry_bulk_size = 1000
+    log_full_context_outcomes = {
+        "full": {"failed", "skipped", "new", "updated", "deleted"},
+        "changes": {"failed", "new", "updated", "deleted"},
+        "failures": {"failed"},
+    }
+    _vevent_state_attrs = [
+        "vevent",
+        "vevent_standard_mapping",
+        "vevent_final_mapping",
+        "vevent_hints",
+        "vevent_errors",
+        "vevent_imported_event",
+        "vevent_diff",
+        "vevent_is_new",
+        "vevent_is_unchanged",
+        "vevent_needs_write",
+        "vevent_place_id",
+        "vevent_organizer_id",
+        "vevent_eventcally_event",
+        "vevent_fingerprint",
+        "vevent_text",
+        "eventcally_event",
+    ]
 
     def __init__(self):
         self.calendar = None
+        self.calendar_name = None
+        self.feed_cache = None
+        self.feed_shared = None
+        self.render_cache = None
+        self.changed_field = None
+        self.vevent_limit = None
+        self.vevent_window = None
         self.dry = True
         self.run = None
         self.api_client = None
         self.configuration = None
-        self.template_env = Environment(loader=BaseLoader())
         self.uids_to_import = None
         self.categories = None
+        self.feed_unchanged = False
+        self.feed_hash = None
+        self.feed_etag = None
+        self.feed_last_modified = None
+        self.feed_valid_until = None
+        self.mapping_templates = None
+        self.mapping_templates_hash = None
+        self.imported_events_by_uid = None
+        self.eventcally_events_by_id = dict()
+        self.eventcally_place_ids_by_name = dict()
+        self.eventcally_organizer_ids_by_name = dict()
+        self.reference_cache = None
+        self.cached_references = set()
+        self.invalidated_references = set()
+        self.vevent_batch = list()
+        self.vevent_batch_uids = set()
+        self.log_entries = list()
+        self.phase_durations = dict()
+        self.template_cache_info = None
+        self.vevent_count = 0
+        self.vevent_total_count = 0
+        self.uids_outside_window = set()
 
         self.vevent = None
         self.vevent_standard_mapping = None
@@ -34,12 +119,14 @@ class IcalImporter:
         self.vevent_imported_event = None
 
     def perform(self, configuration: Configuration):
+        self.template_cache_info = template_cache.info()
+
         try:
             self.configuration = configuration
             self._create_run()
             self._perform()
         except Exception as e:
-            self._log(f"Error: {str(e)} {traceback.format_exc()}")
+            self._log(f"Error: {str(e)} {traceback.format_exc()}", outcome="failed")
             self.run.status = "failure"
 
             if not self.dry:
@@ -47,56 +134,423 @@ class IcalImporter:
 
                 app.logger.error("perform", exc_info=e)
 
-    def _perform(self):
-        self._ensure_api_client()
-        self.uids_to_import = set()
+        try:
+            if not self.dry and self.run:
+                self._store_feed_state()
 
-        if not self.dry:
-            self._load_events_from_eventcally()
-            self._load_categories_from_eventcally()
+                with self._measure_phase("db_flush"):
+                    self._flush_log_entries()
 
+            if self.run:
+                self._create_run_metrics()
+        finally:
+            # Pooled sessions that are checked out are never closed as idle
+            if self.api_client:
+                self.api_client.json_client.close()
+
+    def _perform(self):
         if not self.calendar:
             self._load_calendar_from_url()
 
+        if self.feed_unchanged:
+            self.run.feed_unchanged = True
+            self._log("Feed hat sich seit dem letzten Lauf nicht geändert", type="feed")
+            return
+
         if not self.calendar:
             return
 
-        for vevent in self.calendar.events:
-            self._begin_vevent(vevent)
-            self._create_standard_mapping()
-            self._create_event_mapping()
-            self._check_for_missing_fields()
+        if not self.dry:
+            self._ensure_api_client()
+
+        self._create_mapping_templates()
+        self._create_imported_event_index()
+        self.uids_to_import = set()
+
+        if not self.dry:
+            with self._measure_phase("eventcally_load"):
+                self._load_events_from_eventcally()
+                self._load_categories_from_eventcally()
+                self.reference_cache = ReferenceCache(
+                    self.configuration.organization_id
+                )
+                self.reference_cache.load()
+
+        for vevent in self._get_vevents():
+            if self._is_vevent_batch_full(vevent):
+                self._process_vevent_batch()
+
+            with self._measure_phase("mapping"):
+                self._map_vevent(vevent)
 
-            if not self.dry and self._check_event_for_changes():
-                self._upsert_place()
-                self._upsert_organizer()
-                self._create_eventcally_event()
-                self._send_event_to_eventcally()
+            self.vevent_batch.append(self._capture_vevent_state())
+            self.vevent_batch_uids.add(vevent.uid)
+            self.vevent_count += 1
 
-            self._end_vevent()
+        self._process_vevent_batch()
 
         if not self.dry:
-            self._delete_non_existing_events_from_eventcally()
+            with self._measure_phase("deletion"):
+                self._delete_non_existing_events_from_eventcally()
+
+    def _get_vevents(self):
+        vevents = self._filter_vevents_by_import_window(self.calendar.events)
+        self.vevent_total_count = len(vevents)
+
+        if not self.vevent_window and not self.vevent_limit:
+            return vevents
+
+        if self.vevent_window:
+            start, end = self.vevent_window
+            vevents = [v for v in vevents if v.begin and start <= v.begin <= end]
+        else:
+            now = arrow.utcnow()
+            upcoming = [v for v in vevents if v.begin and (v.end or v.begin) >= now]
+
+            # A feed without upcoming events shows its latest events instead
+            if not upcoming:
+                vevents = sorted((v for v in vevents if v.begin), key=lambda v: v.begin)
+                return vevents[-self.vevent_limit :]
+
+            vevents = upcoming
+
+        vevents = sorted(vevents, key=lambda v: v.begin)
+        return vevents[: self.vevent_limit] if self.vevent_limit else vevents
+
+    def _filter_vevents_by_import_window(self, vevents):
+        self.uids_outside_window = set()
+        window_start, window_end = self._get_import_window()
+        future_days = self.configuration.import_window_future_days
+
+        if window_start is None and window_end is None:
+            return vevents
+
+        inside = list()
+
+        for vevent in vevents:
+            # The last occurrence of a recurring event is not known here, so
+            # only its first occurrence is checked against the window end.
+            is_recurring = any(
+                line.name in recurrence_line_names for line in vevent.extra
+            )
+            ends_before = (
+                window_start is not None
+                and not is_recurring
+                and vevent.begin
+                and (vevent.end or vevent.begin) < window_start
+            )
+            begins_after = (
+                window_end is not None and vevent.begin and vevent.begin > window_end
+            )
+
+            # Events of an unchanged feed move into the window over time, so
+            # the feed has to be processed again when the first one does.
+            if begins_after:
+                self._limit_feed_validity(
+                    vevent.begin.shift(days=-future_days).datetime
+                )
+
+            if ends_before or begins_after:
+                self.uids_outside_window.add(vevent.uid)
+            else:
+                inside.append(vevent)
+
+        if len(inside) < len(vevents):
+            self._log(
+                f"{len(vevents) - len(inside)} Events außerhalb des Importzeitraums",
+                type="feed",
+            )
+
+        return inside
+
+    def _get_import_window(self) -> tuple:
+        past_days = self.configuration.import_window_past_days
+        future_days = self.configuration.import_window_future_days
+        now = arrow.utcnow()
+        window_start = now.shift(days=-past_days) if past_days is not None else None
+        window_end = now.shift(days=future_days) if future_days is not None else None
+        return window_start, window_end
+
+    def _map_vevent(self, vevent):
+        self._begin_vevent(vevent)
+
+        if self._is_vevent_unchanged_since_last_run():
+            self.vevent_final_mapping = self.vevent_imported_event.event
+            self._mark_vevent_unchanged()
+            return
+
+        self._create_standard_mapping()
+        self._create_event_mapping()
+        self._check_for_missing_fields()
+        self._expand_recurrence_rule()
+
+        if self.dry or self._is_vevent_without_occurrences():
+            return
+
+        if self._check_event_for_changes():
+            self.vevent_needs_write = True
+
+    @contextmanager
+    def _measure_phase(self, phase: str):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.phase_durations[phase] = self.phase_durations.get(phase, 0) + duration
+
+    def _create_run_metrics(self):
+        self.run.metrics = {
+            "phases": {k: round(v, 4) for k, v in self.phase_durations.items()},
+            "api_calls": self.api_client.json_client.request_counts
+            if self.api_client
+            else dict(),
+            "vevent_count": self.vevent_count,
+            "template_cache": self._get_template_cache_info(),
+        }
+
+    def _get_template_cache_info(self) -> dict:
+        # The cache is shared by the runs of a process, so only the lookups
+        # since the start of this run are counted
+        info = template_cache.info()
+
+        for key in ["hits", "misses"]:
+            info[key] -= self.template_cache_info[key]
+
+        return info
+
+    def _is_vevent_batch_full(self, vevent) -> bool:
+        from project import app
+
+        # A vevent whose uid is already part of the batch has to see the
+        # result of the earlier write, e.g. recurrence overrides.
+        return (
+            len(self.vevent_batch) >= app.config["IMPORT_BATCH_SIZE"]
+            or vevent.uid in self.vevent_batch_uids
+        )
+
+    def _process_vevent_batch(self):
+        write_states = [s for s in self.vevent_batch if s["vevent_needs_write"]]
+
+        with self._measure_phase("api_write"):
+            self._send_vevent_states_to_eventcally(write_states)
+
+        with self._measure_phase("log"):
+            for state in self.vevent_batch:
+                self._restore_vevent_state(state)
+
+                if "result" in state:
+                    self._apply_event_request_result(state["result"])
+
+                self._end_vevent()
+
+        self.vevent_batch = list()
+        self.vevent_batch_uids = set()
+
+    def _send_vevent_states_to_eventcally(self, write_states: list):
+        # Dry runs never write, so they neither call eventcally nor touch the
+        # reference cache.
+        if not write_states:
+            return
+
+        self._prefetch_places_and_organizers(write_states)
+
+        event_requests = list()
+        for state in write_states:
+            self._restore_vevent_state(state)
+            self._upsert_place()
+            self._upsert_organizer()
+            self._create_eventcally_event()
+            state.update(self._capture_vevent_state())
+            eventcally_event_id = (
+                self.vevent_imported_event.eventcally_event_id
+                if self.vevent_imported_event
+                else None
+            )
+            event_requests.append(
+                {
+                    "eventcally_event_id": eventcally_event_id,
+                    "event": self.vevent_eventcally_event,
+                }
+            )
+
+        results = self._map_concurrently(
+            self._send_event_request_to_eventcally, event_requests
+        )
+        self._retry_event_requests_with_stale_references(
+            write_states, event_requests, results
+        )
+
+        for state, result in zip(write_states, results):
+            state["result"] = result
+
+    def _capture_vevent_state(self) -> dict:
+        return {attr: getattr(self, attr) for attr in IcalImporter._vevent_state_attrs}
+
+    def _restore_vevent_state(self, state: dict):
+        for attr, value in state.items():
+            setattr(self, attr, value)
+
+    def _map_concurrently(self, func, items: list) -> list:
+        return map_concurrently(func, items, self._get_write_concurrency())
+
+    def _get_write_concurrency(self) -> int:
+        from project import app
+
+        return self.configuration.write_concurrency or app.config["WRITE_CONCURRENCY"]
 
     def _load_categories_from_eventcally(self):
         category_list = self.api_client.get_categories()
         self.categories = {c["name"]: {"id": c["id"]} for c in category_list}
 
     def _load_calendar_from_url(self):
-        try:
-            self.calendar = Calendar(requests.get(self.configuration.url).text)
-            self.calendar_name = next(
-                (
-                    line.value
-                    for line in self.calendar.extra
-                    if line.name == "X-WR-CALNAME"
-                ),
-                None,
+        if self.feed_cache is not None:
+            cached = self.feed_cache.get(self.configuration.url)
+
+            if cached:
+                self.calendar, self.calendar_name = cached
+                return
+
+        self._download_calendar()
+
+        if self.feed_cache is not None and self.calendar:
+            self.feed_cache.set(
+                self.configuration.url, (self.calendar, self.calendar_name)
             )
+
+    def _download_calendar(self):
+        try:
+            # A shared feed is downloaded once for all configurations with the
+            # same URL, so conditional requests of a single one don't apply.
+            if self._is_feed_shared():
+                feed = shared_feed_cache.fetch(
+                    self.configuration.url, lambda: self._request_feed(dict())
+                )
+            else:
+                feed = self._request_feed(self._get_feed_request_headers())
+
+            if feed is None:
+                self.feed_unchanged = True
+                return
+
+            self.feed_etag = feed["etag"]
+            self.feed_last_modified = feed["last_modified"]
+            self.feed_hash = feed["hash"]
+
+            if not self.dry and app.config["FEED_SNAPSHOTS"]:
+                self._store_feed_snapshot(feed)
+
+            if (
+                not self.dry
+                and self.feed_hash == self.configuration.feed_hash
+                and not self.configuration.is_feed_state_expired()
+            ):
+                self.feed_unchanged = True
+                return
+
+            with self._measure_phase("parse"):
+                if self._is_feed_shared():
+                    parsed = shared_feed_cache.parse(feed, self._parse_calendar)
+                else:
+                    parsed = self._parse_calendar(feed["content"])
+
+            self.calendar, self.calendar_name = parsed
         except Exception as e:
-            self._log(f"Error loading url: {str(e)}")
+            self._log(f"Error loading url: {str(e)}", outcome="failed")
             self.run.status = "failure"
 
+    def _store_feed_snapshot(self, feed: dict):
+        from project import db
+
+        # Unchanged feeds of later runs reference the same snapshot
+        db.session.execute(
+            pg_insert(FeedSnapshot)
+            .values(
+                hash=feed["hash"],
+                content=zlib.compress(feed["content"].encode("utf-8")),
+                created_at=datetime.datetime.utcnow(),
+            )
+            .on_conflict_do_nothing()
+        )
+        self.run.feed_snapshot_hash = feed["hash"]
+
+    def _request_feed(self, headers: dict) -> dict:
+        with self._measure_phase("fetch"):
+            response = requests.get(self.configuration.url, headers=headers)
+
+        observe_feed_download(response)
+
+        if response.status_code == 304:
+            return None
+
+        response.raise_for_status()
+
+        return {
+            "content": response.text,
+            "hash": hashlib.sha256(response.content).hexdigest(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    def _parse_calendar(self, content: str) -> tuple:
+        calendar = Calendar(content)
+        calendar_name = next(
+            (line.value for line in calendar.extra if line.name == "X-WR-CALNAME"),
+            None,
+        )
+        return calendar, calendar_name
+
+    def _is_feed_shared(self) -> bool:
+        if self.dry:
+            return False
+
+        if self.feed_shared is None:
+            self.feed_shared = (
+                Configuration.query.filter(
+                    Configuration.url == self.configuration.url
+                ).count()
+                > 1
+            )
+
+        return self.feed_shared
+
+    def _get_feed_request_headers(self):
+        # Only a run that completed successfully stores the feed state, so an
+        # unchanged feed implies that there is nothing left to reconcile.
+        headers = dict()
+
+        if (
+            self.dry
+            or not self.configuration.feed_hash
+            or self.configuration.is_feed_state_expired()
+        ):
+            return headers
+
+        if self.configuration.feed_etag:
+            headers["If-None-Match"] = self.configuration.feed_etag
+
+        if self.configuration.feed_last_modified:
+            headers["If-Modified-Since"] = self.configuration.feed_last_modified
+
+        return headers
+
+    def _store_feed_state(self):
+        if self.run.status != "success":
+            self.configuration.reset_feed_state()
+            return
+
+        if not self.feed_hash:
+            return
+
+        self.configuration.feed_etag = self.feed_etag
+        self.configuration.feed_last_modified = self.feed_last_modified
+        self.configuration.feed_hash = self.feed_hash
+
+        # The events of an unchanged feed were not looked at
+        if not self.feed_unchanged:
+            self.configuration.feed_valid_until = self.feed_valid_until
+
     def _create_run(self):
         self.run = Run(status="success")
 
@@ -141,8 +595,37 @@ class IcalImporter:
 
         standard["end"] = end
 
+        # Only recurring events have the key, so that the stored mappings of
+        # other events do not differ from the new ones.
+        recurrence_rule = self._create_recurrence_rule()
+        if recurrence_rule:
+            standard["recurrence_rule"] = recurrence_rule
+
         self.vevent_standard_mapping = standard
 
+    def _create_recurrence_rule(self) -> str:
+        if not any(line.name in recurrence_line_names for line in self.vevent.extra):
+            return ""
+
+        timezone = app.config["BABEL_DEFAULT_TIMEZONE"]
+
+        try:
+            recurrence_rule = create_recurrence_rule(self.vevent, timezone)
+            validate_recurrence_rule(
+                recurrence_rule,
+                self.vevent.begin.to(timezone).naive,
+            )
+        except Exception as e:
+            self.vevent_hints.append(
+                {
+                    "key": "recurrence_rule",
+                    "msg": f"Recurrence rule is not supported: {str(e)}",
+                }
+            )
+            return ""
+
+        return recurrence_rule
+
     def _begin_vevent(self, vevent):
         self.vevent = vevent
         self.vevent_final_mapping = dict()
@@ -152,15 +635,17 @@ class IcalImporter:
         self.vevent_diff = None
         self.vevent_is_new = True
         self.vevent_is_unchanged = False
+        self.vevent_needs_write = False
+        self.vevent_place_id = None
+        self.vevent_organizer_id = None
+        self.vevent_eventcally_event = None
+        self.vevent_text = None
+        self.vevent_fingerprint = None if self.dry else self._get_vevent_fingerprint()
+        self.uids_to_import.add(vevent.uid)
 
         if self.vevent_imported_event:
-            self.eventcally_event = next(
-                (
-                    e
-                    for e in self.eventcally_events
-                    if str(e["id"]) == self.vevent_imported_event.eventcally_event_id
-                ),
-                None,
+            self.eventcally_event = self.eventcally_events_by_id.get(
+                str(self.vevent_imported_event.eventcally_event_id)
             )
         else:
             self.eventcally_event = None
@@ -170,6 +655,7 @@ class IcalImporter:
             self.run.status = "failure"
             self.run.failure_event_count = self.run.failure_event_count + 1
             message = "Fehler beim Einlesen eines Events aus iCal"
+            outcome = "failed"
         elif self.vevent_hints:
             self.run.skipped_event_count = self.run.skipped_event_count + 1
             message = (
@@ -177,16 +663,34 @@ class IcalImporter:
                 if self.vevent_is_unchanged
                 else "Event übersprungen (s. Hints)"
             )
+            outcome = "skipped"
         else:
             message = "Event importiert" if self.vevent_is_new else "Event aktualisiert"
-
-        context = {
-            "vevent": self.vevent.serialize(),
-            "standard": self.vevent_standard_mapping,
-            "event": self.vevent_final_mapping,
-            "hints": self.vevent_hints,
-            "errors": self.vevent_errors,
-        }
+            outcome = "new" if self.vevent_is_new else "updated"
+
+        if self.changed_field:
+            context = {
+                "vevent_uid": self.vevent.uid,
+                "field": self.changed_field,
+                "value": self.vevent_final_mapping.get(self.changed_field),
+                "hints": self.vevent_hints,
+                "errors": self.vevent_errors,
+            }
+        elif self._is_full_log_context(outcome):
+            context = {
+                "vevent_uid": self.vevent.uid,
+                "vevent": self._get_vevent_text(),
+                "standard": self.vevent_standard_mapping,
+                "event": self.vevent_final_mapping,
+                "hints": self.vevent_hints,
+                "errors": self.vevent_errors,
+            }
+        else:
+            context = {
+                "vevent_uid": self.vevent.uid,
+                "hints": self.vevent_hints,
+                "errors": self.vevent_errors,
+            }
 
         if self.vevent_imported_event:
             context["imported_event"] = {
@@ -198,17 +702,56 @@ class IcalImporter:
         if self.vevent_diff:
             context["diff"] = self.vevent_diff
 
-        self._log(message=message, type="vevent", context=context)
+        self._log(message=message, type="vevent", context=context, outcome=outcome)
+
+    def _create_mapping_templates(self):
+        self.mapping_templates = {
+            attr: MappingTemplate(getattr(self.configuration, attr))
+            for attr in Configuration._mapper_attrs
+        }
+        sources = "\0".join(str(t.source) for t in self.mapping_templates.values())
+        self.mapping_templates_hash = hashlib.sha256(
+            sources.encode("utf-8")
+        ).hexdigest()
+
+    def _get_vevent_text(self) -> str:
+        if self.vevent_text is None:
+            self.vevent_text = self.vevent.serialize()
+
+        return self.vevent_text
+
+    def _get_vevent_fingerprint(self) -> str:
+        # DTSTAMP is usually the time the feed was generated
+        lines = [
+            line
+            for line in self._get_vevent_text().splitlines()
+            if not line.startswith("DTSTAMP")
+        ]
+        lines.append(self.calendar_name or "")
+        lines.append(self._get_event_tags())
+        lines.append(self.mapping_templates_hash)
+        return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+    def _is_vevent_unchanged_since_last_run(self) -> bool:
+        if (
+            not self.vevent_fingerprint
+            or not self.vevent_imported_event
+            or not self.vevent_imported_event.event
+            or self.vevent_imported_event.fingerprint != self.vevent_fingerprint
+        ):
+            return False
+
+        # Expanded occurrences depend on the current date
+        if "recurrence_dates" in self.vevent_imported_event.event:
+            return False
+
+        return not self._has_eventcally_event_other_tags()
 
     def _create_event_mapping(self):
         for key in self.vevent_standard_mapping.keys():
-            if key in self.configuration._mapper_attrs:
+            if key in self.mapping_templates:
                 try:
-                    template_str = getattr(self.configuration, key)
-                    template = self.template_env.from_string(template_str)
-                    self.vevent_final_mapping[key] = template.render(
-                        standard=self.vevent_standard_mapping, vevent=self.vevent
-                    )
+                    self.vevent_final_mapping[key] = self._render_mapping_template(key)
                 except Exception as e:
                     self.vevent_errors.append(
                         {
@@ -219,7 +762,97 @@ class IcalImporter:
             else:
                 self.vevent_final_mapping[key] = self.vevent_standard_mapping[key]
 
-        self.uids_to_import.add(self.vevent.uid)
+    def _render_mapping_template(self, key: str) -> str:
+        template = self.mapping_templates[key]
+
+        if self.render_cache is None or template.kind != "template":
+            return template.render(
+                standard=self.vevent_standard_mapping, vevent=self.vevent
+            )
+
+        # Templates only see the VEVENT and the standard mapping, which is
+        # derived from the VEVENT and the calendar name.
+        vevent_hash = hashlib.sha256(
+            f"{self._get_vevent_text()}\0{self.calendar_name}".encode("utf-8")
+        ).hexdigest()
+        memo_key = (template.source_hash, vevent_hash, key)
+        memo = self.render_cache.get(memo_key)
+
+        if memo is None:
+            try:
+                memo = (
+                    template.render(
+                        standard=self.vevent_standard_mapping, vevent=self.vevent
+                    ),
+                    None,
+                )
+            except Exception as e:
+                # Only the message is kept, a cached exception would keep its
+                # traceback and frames alive.
+                memo = (None, str(e))
+
+            self.render_cache.set(memo_key, memo)
+
+        value, error = memo
+
+        if error is not None:
+            raise ValueError(error)
+
+        return value
+
+    def _expand_recurrence_rule(self):
+        recurrence_rule = self.vevent_final_mapping.get("recurrence_rule")
+
+        if (
+            not recurrence_rule
+            or is_native_recurrence_rule(recurrence_rule)
+            or self.vevent_errors
+        ):
+            return
+
+        # Several rules can not be expressed in one date definition, so the
+        # occurrences are expanded into date definitions of the same event.
+        # The mapped allday flag is rendered text, e.g. "False".
+        allday = str(self.vevent_final_mapping["allday"]).lower() in ("true", "1", "t")
+        window_start = self._get_import_window()[0]
+
+        try:
+            date_definitions, changes_at = expand_recurrence_rule(
+                recurrence_rule,
+                self.vevent_final_mapping["start"],
+                self.vevent_final_mapping["end"],
+                allday,
+                app.config["BABEL_DEFAULT_TIMEZONE"],
+                app.config["RECURRENCE_EXPANSION_LIMIT"],
+                app.config["RECURRENCE_EXPANSION_DAYS"],
+                window_start.datetime if window_start else None,
+            )
+        except Exception as e:
+            self.vevent_errors.append({"key": "recurrence_rule", "msg": str(e)})
+            return
+
+        self.vevent_final_mapping["recurrence_dates"] = date_definitions
+        self._limit_feed_validity(changes_at)
+
+        if not date_definitions:
+            self.vevent_hints.append(
+                {
+                    "key": "recurrence_rule",
+                    "msg": "Recurrence rule has no occurrences to import",
+                }
+            )
+
+    def _is_vevent_without_occurrences(self) -> bool:
+        return self.vevent_final_mapping.get("recurrence_dates") == []
+
+    def _limit_feed_validity(self, valid_until: datetime.datetime):
+        if not valid_until:
+            return
+
+        valid_until = valid_until.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+        if not self.feed_valid_until or valid_until < self.feed_valid_until:
+            self.feed_valid_until = valid_until
 
     def _check_for_missing_fields(self):
         for required_key in IcalImporter.required_keys:
@@ -242,38 +875,148 @@ class IcalImporter:
                 }
             )
 
+    def _create_imported_event_index(self):
+        self.imported_events_by_uid = dict()
+
+        for imported_event in self.configuration.imported_events:
+            self.imported_events_by_uid.setdefault(
+                imported_event.vevent_uid, imported_event
+            )
+
     def _find_imported_event_for_vevent(self, vevent) -> ImportedEvent:
-        return next(
-            (
-                i
-                for i in self.configuration.imported_events
-                if i.vevent_uid == vevent.uid
-            ),
-            None,
+        return self.imported_events_by_uid.get(vevent.uid)
+
+    def _remove_imported_events(self, imported_events: set):
+        if not imported_events:
+            return
+
+        self.configuration.imported_events = [
+            i for i in self.configuration.imported_events if i not in imported_events
+        ]
+
+        for imported_event in imported_events:
+            if (
+                self.imported_events_by_uid.get(imported_event.vevent_uid)
+                is imported_event
+            ):
+                del self.imported_events_by_uid[imported_event.vevent_uid]
+
+    def _prefetch_places_and_organizers(self, states: list):
+        upserts = list()
+
+        for kind in ["place", "organizer"]:
+            ids_by_name = self._get_eventcally_ids_by_name(kind)
+            names = dict.fromkeys(
+                s["vevent_final_mapping"][f"{kind}_name"]
+                for s in states
+                if s["vevent_final_mapping"][f"{kind}_name"] not in ids_by_name
+            )
+
+            for name in names:
+                cached_id = (
+                    self.reference_cache.get(kind, name)
+                    if self.reference_cache
+                    else None
+                )
+
+                if cached_id:
+                    ids_by_name[name] = cached_id
+                    self.cached_references.add((kind, name))
+                else:
+                    upserts.append((kind, name))
+
+        ids = self._map_concurrently(self._call_upsert, upserts)
+        resolved = {"place": dict(), "organizer": dict()}
+
+        for (kind, name), eventcally_id in zip(upserts, ids):
+            resolved[kind][name] = eventcally_id
+
+        # Re-resolved references are valid again
+        self.invalidated_references.difference_update(upserts)
+
+        for kind, references in resolved.items():
+            self._get_eventcally_ids_by_name(kind).update(references)
+
+            if self.reference_cache:
+                self.reference_cache.store(kind, references)
+
+    def _call_upsert(self, upsert: tuple) -> int:
+        kind, name = upsert
+
+        if kind == "place":
+            return self.api_client.upsert_place({"name": name})
+
+        return self.api_client.upsert_organizer({"name": name})
+
+    def _get_eventcally_ids_by_name(self, kind: str) -> dict:
+        if kind == "place":
+            return self.eventcally_place_ids_by_name
+
+        return self.eventcally_organizer_ids_by_name
+
+    def _invalidate_cached_references(self, state: dict, kinds: set) -> bool:
+        # Ids from the reference cache are not verified by eventcally, so a
+        # place or organizer may have been deleted in the meantime.
+        stale = False
+
+        for kind in kinds:
+            key = (kind, state["vevent_final_mapping"][f"{kind}_name"])
+
+            if key in self.cached_references:
+                self.cached_references.remove(key)
+                self.invalidated_references.add(key)
+                self.reference_cache.invalidate(*key)
+                self._get_eventcally_ids_by_name(kind).pop(key[1], None)
+
+            if key in self.invalidated_references:
+                stale = True
+
+        return stale
+
+    def _retry_event_requests_with_stale_references(
+        self, states: list, event_requests: list, results: list
+    ):
+        retry_indexes = [
+            i
+            for i, result in enumerate(results)
+            if result[2] and self._invalidate_cached_references(states[i], result[2])
+        ]
+
+        if not retry_indexes:
+            return
+
+        self._prefetch_places_and_organizers([states[i] for i in retry_indexes])
+
+        for i in retry_indexes:
+            self._restore_vevent_state(states[i])
+            self._upsert_place()
+            self._upsert_organizer()
+            self._create_eventcally_event()
+            states[i].update(self._capture_vevent_state())
+            event_requests[i]["event"] = self.vevent_eventcally_event
+
+        retry_results = self._map_concurrently(
+            self._send_event_request_to_eventcally,
+            [event_requests[i] for i in retry_indexes],
         )
 
+        for i, result in zip(retry_indexes, retry_results):
+            results[i] = result
+
     def _upsert_place(self):
         place_name = self.vevent_final_mapping["place_name"]
-        self.vevent_place_id = next(
-            (p["id"] for p in self.eventcally_places if p["name"] == place_name),
-            None,
-        )
+        self.vevent_place_id = self.eventcally_place_ids_by_name.get(place_name)
 
         if self.vevent_place_id:
             return
 
         self.vevent_place_id = self.api_client.upsert_place({"name": place_name})
-        self.eventcally_places.append({"id": self.vevent_place_id, "name": place_name})
+        self.eventcally_place_ids_by_name[place_name] = self.vevent_place_id
 
     def _upsert_organizer(self):
         organizer_name = self.vevent_final_mapping["organizer_name"]
-        self.vevent_organizer_id = next(
-            (
-                o["id"]
-                for o in self.eventcally_organizers
-                if o["name"] == organizer_name
-            ),
-            None,
+        self.vevent_organizer_id = self.eventcally_organizer_ids_by_name.get(
+            organizer_name
         )
 
         if self.vevent_organizer_id:
@@ -282,9 +1025,7 @@ class IcalImporter:
         self.vevent_organizer_id = self.api_client.upsert_organizer(
             {"name": organizer_name}
         )
-        self.eventcally_organizers.append(
-            {"id": self.vevent_organizer_id, "name": organizer_name}
-        )
+        self.eventcally_organizer_ids_by_name[organizer_name] = self.vevent_organizer_id
 
     def _create_eventcally_event(self):
         eventcally_event = dict()
@@ -312,16 +1053,7 @@ class IcalImporter:
         additional_tags = self.vevent_final_mapping["tags"]
         eventcally_event["tags"] = additional_tags if additional_tags else ""
 
-        eventcally_event["date_definitions"] = [
-            {
-                "start": self.vevent_final_mapping["start"],
-                "allday": self.vevent_final_mapping["allday"],
-            }
-        ]
-
-        end = self.vevent_final_mapping["end"]
-        if end:
-            eventcally_event["date_definitions"][0]["end"] = end
+        eventcally_event["date_definitions"] = self._create_date_definitions()
 
         photo_url = self.vevent_final_mapping["photo_url"]
         photo_copyright_text = self.vevent_final_mapping["photo_copyright_text"]
@@ -334,22 +1066,48 @@ class IcalImporter:
 
         self.vevent_eventcally_event = eventcally_event
 
+    def _create_date_definitions(self) -> list:
+        start = self.vevent_final_mapping["start"]
+        end = self.vevent_final_mapping["end"]
+        allday = self.vevent_final_mapping["allday"]
+        recurrence_rule = self.vevent_final_mapping.get("recurrence_rule")
+
+        date_definition = {
+            "start": start,
+            "allday": allday,
+        }
+
+        if end:
+            date_definition["end"] = end
+
+        if not recurrence_rule:
+            return [date_definition]
+
+        if is_native_recurrence_rule(recurrence_rule):
+            date_definition["recurrence_rule"] = recurrence_rule
+            return [date_definition]
+
+        return self.vevent_final_mapping["recurrence_dates"]
+
     def _ensure_api_client(self):
         if not self.api_client:
             self.api_client = ApiClient(
                 JsonClient(oauth.eventcally, self.configuration.user)
             )
             self.api_client.organization_id = self.configuration.organization_id
+            self.api_client.max_workers = self._get_write_concurrency()
+            self.api_client.json_client.semaphore = get_organization_semaphore(
+                self.configuration.organization_id
+            )
 
     def _load_events_from_eventcally(self):
         tag = self._get_configuration_event_tag()
-        events = self.api_client.find_events_by_tag(tag)
-        events.extend(self.api_client.find_events_by_internal_tag(tag))
+        events = self.api_client.find_events_by_tag_or_internal_tag(tag)
 
-        to_remove_from_imported_events = list(self.configuration.imported_events)
-        self.eventcally_places = []
-        self.eventcally_organizers = []
-        self.eventcally_events = []
+        matched_imported_events = set()
+        self.eventcally_events_by_id = dict()
+        self.eventcally_place_ids_by_name = dict()
+        self.eventcally_organizer_ids_by_name = dict()
 
         for event in events:
             tags = event["tags"].split(",")
@@ -370,25 +1128,29 @@ class IcalImporter:
             if not vevent_uid:
                 continue
 
-            imported_event = next(
-                (
-                    i
-                    for i in self.configuration.imported_events
-                    if i.vevent_uid == vevent_uid
-                ),
-                None,
-            )
-            if imported_event:
-                to_remove_from_imported_events.remove(imported_event)
-            else:
-                self._append_imported_event(vevent_uid, event["id"], None)
+            imported_event = self.imported_events_by_uid.get(vevent_uid)
+            if not imported_event:
+                imported_event = self._append_imported_event(
+                    vevent_uid, event["id"], None
+                )
 
-            self.eventcally_places.append(dict(event["place"]))
-            self.eventcally_organizers.append(dict(event["organizer"]))
-            self.eventcally_events.append(dict(event))
+            matched_imported_events.add(imported_event)
 
-        for to_remove in to_remove_from_imported_events:
-            self.configuration.imported_events.remove(to_remove)
+            place = event["place"]
+            self.eventcally_place_ids_by_name.setdefault(place["name"], place["id"])
+            organizer = event["organizer"]
+            self.eventcally_organizer_ids_by_name.setdefault(
+                organizer["name"], organizer["id"]
+            )
+            self.eventcally_events_by_id.setdefault(str(event["id"]), dict(event))
+
+        self._remove_imported_events(
+            {
+                i
+                for i in self.configuration.imported_events
+                if i not in matched_imported_events
+            }
+        )
 
     def _append_imported_event(
         self, vevent_uid: str, eventcally_event_id: int, event: dict
@@ -398,96 +1160,130 @@ class IcalImporter:
         imported_event.eventcally_event_id = eventcally_event_id
         imported_event.event = event
         self.configuration.imported_events.append(imported_event)
+        self.imported_events_by_uid.setdefault(vevent_uid, imported_event)
         return imported_event
 
-    def _send_event_to_eventcally(self):
-        if self.vevent_imported_event:
-            self._send_event_update_to_eventcally()
-            return
-
-        self._send_event_create_to_eventcally()
-
-    def _send_event_create_to_eventcally(self):
+    def _send_event_request_to_eventcally(self, request: dict) -> tuple:
+        # Runs in a worker thread, so it must not touch the ORM or vevent state
         try:
-            eventcally_event_id = self.api_client.insert_event(
-                self.vevent_eventcally_event
-            )
+            eventcally_event_id = request["eventcally_event_id"]
+
+            if eventcally_event_id:
+                self.api_client.update_event(eventcally_event_id, request["event"])
+            else:
+                eventcally_event_id = self.api_client.insert_event(request["event"])
         except Exception as e:
-            self.vevent_errors.append({"msg": f"{str(e)} {traceback.format_exc()}"})
+            reference_kinds = self._get_invalid_reference_kinds(e)
+            return None, f"{str(e)} {traceback.format_exc()}", reference_kinds
+
+        return eventcally_event_id, None, set()
+
+    def _get_invalid_reference_kinds(self, e: Exception) -> set:
+        if not isinstance(e, UnprocessableEntityError) or not isinstance(e.json, dict):
+            return set()
+
+        fields = {error.get("field") for error in e.json.get("errors", list())}
+        return {kind for kind in ["place", "organizer"] if kind in fields}
+
+    def _apply_event_request_result(self, result: tuple):
+        eventcally_event_id, error, _ = result
+
+        if error:
+            self.vevent_errors.append({"msg": error})
+            return
+
+        if self.vevent_imported_event:
+            self.vevent_imported_event.event = self.vevent_final_mapping
+            self.vevent_imported_event.fingerprint = self.vevent_fingerprint
+            self.vevent_is_new = False
+            self.run.updated_event_count += 1
             return
 
         self.vevent_imported_event = self._append_imported_event(
             self.vevent.uid, eventcally_event_id, self.vevent_final_mapping
         )
+        self.vevent_imported_event.fingerprint = self.vevent_fingerprint
         self.vevent_is_new = True
         self.run.new_event_count += 1
 
-    def _send_event_update_to_eventcally(self):
+    def _delete_event_from_eventcally(self, eventcally_event_id: str) -> list:
+        # Runs in a worker thread, so it must not touch the ORM
         try:
-            self.api_client.update_event(
-                self.vevent_imported_event.eventcally_event_id,
-                self.vevent_eventcally_event,
-            )
-            self.vevent_imported_event.event = self.vevent_final_mapping
-        except Exception as e:
-            self.vevent_errors.append({"msg": f"{str(e)} {traceback.format_exc()}"})
-            return
+            self.api_client.delete_event(eventcally_event_id)
+        except Exception:
+            return [{"msg": traceback.format_exc()}]
 
-        self.vevent_is_new = False
-        self.run.updated_event_count += 1
+        return list()
 
     def _delete_non_existing_events_from_eventcally(self):
-        to_remove_from_imported_events = list()
-        for imported_event in self.configuration.imported_events:
-            if imported_event.vevent_uid not in self.uids_to_import:
-                errors = list()
+        to_delete = [
+            i
+            for i in self.configuration.imported_events
+            if i.vevent_uid not in self.uids_to_import
+            and i.vevent_uid not in self.uids_outside_window
+        ]
+        results = self._map_concurrently(
+            self._delete_event_from_eventcally,
+            [i.eventcally_event_id for i in to_delete],
+        )
 
-                try:
-                    self.api_client.delete_event(imported_event.eventcally_event_id)
-                    to_remove_from_imported_events.append(imported_event)
-                except Exception:
-                    errors.append({"msg": traceback.format_exc()})
-
-                if errors:
-                    self.run.status = "failure"
-                    self.run.failure_event_count += 1
-                else:
-                    self.run.deleted_event_count += 1
-
-                context = {
-                    "imported_event": {
-                        "id": imported_event.id,
-                        "eventcally_event_id": imported_event.eventcally_event_id,
-                        "vevent_uid": imported_event.vevent_uid,
-                        "event": imported_event.event,
-                    },
-                    "errors": errors,
-                }
-                self._log(message="Event gelöscht", type="deleted", context=context)
+        to_remove_from_imported_events = set()
+        for imported_event, errors in zip(to_delete, results):
+            if errors:
+                self.run.status = "failure"
+                self.run.failure_event_count += 1
+            else:
+                to_remove_from_imported_events.add(imported_event)
+                self.run.deleted_event_count += 1
+
+            context = {
+                "imported_event": {
+                    "id": imported_event.id,
+                    "eventcally_event_id": imported_event.eventcally_event_id,
+                    "vevent_uid": imported_event.vevent_uid,
+                    "event": imported_event.event,
+                },
+                "errors": errors,
+            }
+
+            outcome = "failed" if errors else "deleted"
+
+            if not self._is_full_log_context(outcome):
+                del context["imported_event"]["event"]
+
+            self._log(
+                message="Event gelöscht",
+                type="deleted",
+                context=context,
+                outcome=outcome,
+            )
 
-        for to_remove in to_remove_from_imported_events:
-            self.configuration.imported_events.remove(to_remove)
+        self._remove_imported_events(to_remove_from_imported_events)
 
     def _check_event_for_changes(self):
         self._create_event_diff()
-        self.vevent_is_unchanged = not self.vevent_diff
 
-        if (
-            self.vevent_is_unchanged
-            and self.eventcally_event
-            and self.eventcally_event.get("internal_tags") != self._get_event_tags()
-        ):
-            self.vevent_is_unchanged = False
+        if self.vevent_diff or self._has_eventcally_event_other_tags():
+            return True
 
-        if self.vevent_is_unchanged:
-            self.vevent_hints.append(
-                {
-                    "msg": "Event did not change since last run",
-                }
-            )
-            self.run.unchanged_event_count += 1
+        self._mark_vevent_unchanged()
+        self.vevent_imported_event.fingerprint = self.vevent_fingerprint
+        return False
+
+    def _has_eventcally_event_other_tags(self) -> bool:
+        return (
+            self.eventcally_event is not None
+            and self.eventcally_event.get("internal_tags") != self._get_event_tags()
+        )
 
-        return not self.vevent_is_unchanged
+    def _mark_vevent_unchanged(self):
+        self.vevent_is_unchanged = True
+        self.vevent_hints.append(
+            {
+                "msg": "Event did not change since last run",
+            }
+        )
+        self.run.unchanged_event_count += 1
 
     def _create_event_diff(self):
         if not self.vevent_imported_event or not self.vevent_imported_event.event:
@@ -502,9 +1298,71 @@ class IcalImporter:
 
         self.vevent_diff = diff
 
-    def _log(self, message, **kwargs):
-        log_entry = LogEntry(message=message, **kwargs)
-        self.run.log_entries.append(log_entry)
+    def _log(self, message, type=None, context=None, outcome=None):
+        if context and not self.dry:
+            context = self._limit_log_context_size(context)
+
+        self.log_entries.append(
+            {
+                "created_at": datetime.datetime.utcnow(),
+                "message": message,
+                "type": type,
+                "outcome": outcome,
+                "context": context,
+            }
+        )
+
+    def _is_full_log_context(self, outcome: str) -> bool:
+        from project import app
+
+        if self.dry:
+            return True
+
+        verbosity = self.configuration.log_verbosity or app.config["LOG_VERBOSITY"]
+        full_context_outcomes = IcalImporter.log_full_context_outcomes.get(
+            verbosity, IcalImporter.log_full_context_outcomes["full"]
+        )
+        return outcome in full_context_outcomes
+
+    def _limit_log_context_size(self, context: dict) -> dict:
+        from project import app
+
+        max_size = app.config["LOG_ENTRY_MAX_CONTEXT_SIZE"]
+
+        # Every field is serialized once and the size of the whole context is
+        # derived from the field sizes, plus quoted keys and separators.
+        sizes = {key: len(app.json.dumps(value)) for key, value in context.items()}
+        size = sum(sizes.values()) + sum(len(key) + 4 for key in context) + 2
+
+        if size <= max_size:
+            return context
+
+        truncated_size = len('"[truncated]"')
+        size += len('"truncated": true, ')
+
+        for key in ["vevent", "standard", "event", "diff", "errors"]:
+            if size <= max_size:
+                break
+
+            if key in context:
+                size -= sizes[key] - truncated_size
+                context[key] = "[truncated]"
+                context["truncated"] = True
+
+        return context
+
+    def _flush_log_entries(self):
+        from project import db
+
+        db.session.flush()
+
+        for i in range(0, len(self.log_entries), IcalImporter.log_entry_bulk_size):
+            chunk = self.log_entries[i : i + IcalImporter.log_entry_bulk_size]
+            db.session.execute(
+                insert(LogEntry), [dict(e, run_id=self.run.id) for e in chunk]
+            )
+
+        self.log_entries = list()
 
     def _get_event_tags(self):
         return f"{self._get_configuration_event_tag()},{self._get_vevent_event_tag()}"
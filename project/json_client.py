@@ -1,10 +1,22 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
 from typing import Any
 
 from authlib.common.urls import urlparse
 from authlib.integrations.requests_client import OAuth2Session
 from requests import Response
+from requests.adapters import HTTPAdapter
 
 from project import app
+from project.cache import LRUCache
+from project.metrics import (
+    observe_eventcally_connection,
+    observe_eventcally_request,
+    observe_eventcally_session,
+)
+from project.token_broker import token_broker
 
 
 class UnprocessableEntityError(ValueError):
@@ -20,37 +32,192 @@ class NotFoundError(ValueError):
     pass
 
 
-class JsonClient:
-    def __init__(self, oauth_client, user):
-        self.oauth_client = oauth_client
-        self.user = user
-        self.token = self.user.to_token()
+class ConnectionCountingAdapter(HTTPAdapter):
+    def send(self, request, **kwargs):
+        pool = self.get_connection(request.url, kwargs.get("proxies"))
+        num_connections = pool.num_connections
+        response = super().send(request, **kwargs)
+        observe_eventcally_connection(pool.num_connections == num_connections)
+        return response
+
+
+class PooledSession:
+    def __init__(self, session: OAuth2Session):
+        self.session = session
+        self.token_lock = threading.Lock()
+        self.used_at = time.monotonic()
+        self.checkouts = 0
+
+
+class SessionPool:
+    """Per process pool of OAuth2 sessions by OAuth client and user.
+
+    Reusing a session keeps its connections alive across runs. Sessions that
+    are not checked out and were idle for EVENTCALLY_SESSION_IDLE_TIMEOUT
+    seconds are closed.
+    """
+
+    def __init__(self):
+        self._sessions = dict()
+        self._lock = threading.Lock()
+        self._metadata_cache = None
+
+    def get(self, oauth_client, user) -> PooledSession:
+        key = (oauth_client.name, user.id)
+        now = time.monotonic()
+
+        with self._lock:
+            self._close_idle_sessions(now)
+            pooled = self._sessions.get(key)
+            observe_eventcally_session(pooled is not None)
 
-        metadata = oauth_client.load_server_metadata()
-        client_kwargs = oauth_client.client_kwargs
-        client_kwargs.update(metadata)
+            if pooled is None:
+                pooled = PooledSession(self._create_session(oauth_client, user))
+                self._sessions[key] = pooled
 
-        self.session = OAuth2Session(
+            pooled.used_at = now
+            pooled.checkouts += 1
+
+        # The token may have been refreshed by another process
+        with pooled.token_lock:
+            if (user.expires_at or 0) > (pooled.session.token.get("expires_at") or 0):
+                pooled.session.token = user.to_token()
+
+        return pooled
+
+    def release(self, pooled: PooledSession):
+        with self._lock:
+            pooled.checkouts -= 1
+            pooled.used_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            for pooled in self._sessions.values():
+                pooled.session.close()
+
+            self._sessions.clear()
+
+    def _close_idle_sessions(self, now: float):
+        idle_timeout = app.config["EVENTCALLY_SESSION_IDLE_TIMEOUT"]
+
+        for key, pooled in list(self._sessions.items()):
+            if pooled.checkouts == 0 and now - pooled.used_at > idle_timeout:
+                pooled.session.close()
+                del self._sessions[key]
+
+    def _create_session(self, oauth_client, user) -> OAuth2Session:
+        client_kwargs = dict(oauth_client.client_kwargs)
+        client_kwargs.update(self._load_server_metadata(oauth_client))
+        user_id = user.id
+
+        def update_token(token, refresh_token=None, access_token=None):
+            token_broker.store_token(user_id, token)
+
+        session = OAuth2Session(
             oauth_client.client_id,
             oauth_client.client_secret,
-            token=self.token,
-            update_token=self._update_token,
+            token=user.to_token(),
+            update_token=update_token,
             **client_kwargs,
         )
 
-    def _update_token(self, token, refresh_token=None, access_token=None):
-        from project import db
+        adapter = ConnectionCountingAdapter(
+            pool_connections=app.config["EVENTCALLY_POOL_CONNECTIONS"],
+            pool_maxsize=app.config["EVENTCALLY_POOL_MAXSIZE"],
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _load_server_metadata(self, oauth_client) -> dict:
+        if self._metadata_cache is None:
+            self._metadata_cache = LRUCache(
+                ttl=app.config["EVENTCALLY_METADATA_CACHE_TTL"]
+            )
+
+        def load():
+            # Authlib keeps loaded metadata forever, so it is marked as
+            # outdated to load it again after the TTL.
+            oauth_client.server_metadata.pop("_loaded_at", None)
+            metadata = dict(oauth_client.load_server_metadata())
+            metadata.pop("_loaded_at", None)
+            return metadata
 
-        self.user.access_token = token["access_token"]
-        self.user.refresh_token = token.get("refresh_token")
-        self.user.expires_at = token["expires_at"]
-        db.session.commit()
+        return self._metadata_cache.get_or_create(oauth_client.name, load)
+
+
+session_pool = SessionPool()
+
+_organization_semaphores = dict()
+_organization_semaphores_lock = threading.Lock()
+
+
+def get_organization_semaphore(organization_id: str) -> threading.BoundedSemaphore:
+    """Caps the concurrent requests of all runs of a process per organization."""
+    with _organization_semaphores_lock:
+        if organization_id not in _organization_semaphores:
+            _organization_semaphores[organization_id] = threading.BoundedSemaphore(
+                app.config["ORGANIZATION_CONCURRENCY"]
+            )
+
+        return _organization_semaphores[organization_id]
+
+
+class JsonClient:
+    def __init__(self, oauth_client, user):
+        self.oauth_client = oauth_client
+        self.user = user
+        self._request_counts_lock = threading.Lock()
+        self.request_counts = dict()
+
+        self.semaphore = None
+
+        self._pooled = session_pool.get(oauth_client, user)
+        self.session = self._pooled.session
+        self._token_lock = self._pooled.token_lock
+
+    def close(self):
+        """Returns the session to the pool."""
+        if self._pooled:
+            session_pool.release(self._pooled)
+            self._pooled = None
+
+    @contextmanager
+    def limit(self):
+        if not self.semaphore:
+            yield
+            return
+
+        with self.semaphore:
+            yield
+
+    def ensure_active_token(self):
+        # Requests may be sent from several threads and the session is shared
+        # between clients, so only one of them may refresh an expired token.
+        with self._token_lock:
+            token_broker.ensure_active_token(self.session, self.user.id)
 
     def complete_url(self, url: str) -> str:
         return urlparse.urljoin(self.oauth_client.api_base_url, "/api/v1" + url)
 
+    def get_route_template(self, response: Response) -> str:
+        path = urlparse.urlparse(response.url).path.removeprefix("/api/v1")
+        return re.sub(r"/\d+(?=/|$)", "/{id}", path)
+
+    def count_request(self, response: Response):
+        method = response.request.method
+        route = self.get_route_template(response)
+        endpoint = f"{method} {route}"
+        status_code = str(response.status_code)
+        observe_eventcally_request(method, route, response)
+
+        with self._request_counts_lock:
+            counts = self.request_counts.setdefault(endpoint, dict())
+            counts[status_code] = counts.get(status_code, 0) + 1
+
     def status_code_or_raise(self, response: Response, code: int):
         app.logger.debug(f"Response: {response.status_code} {response.content}")
+        self.count_request(response)
         if response.status_code == code:
             return
 
@@ -65,51 +232,61 @@ class JsonClient:
         raise ValueError(msg, response)
 
     def get(self, url: str) -> Response:
+        self.ensure_active_token()
         url = self.complete_url(url)
         app.logger.debug(f"GET {url}")
-        response = self.session.get(url)
+        with self.limit():
+            response = self.session.get(url)
         self.status_code_or_raise(response, 200)
         return response
 
     def post(self, url: str, data: Any) -> Response:
+        self.ensure_active_token()
         url = self.complete_url(url)
         body = app.json.dumps(data)
         app.logger.debug(f"POST {url}\n{body}")
-        response = self.session.post(
-            url,
-            data=body,
-            headers={"Content-Type": "application/json"},
-        )
+        with self.limit():
+            response = self.session.post(
+                url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+            )
         self.status_code_or_raise(response, 201)
         return response
 
     def put(self, url: str, data: Any) -> Response:
+        self.ensure_active_token()
         url = self.complete_url(url)
         body = app.json.dumps(data)
         app.logger.debug(f"PUT {url}\n{body}")
-        response = self.session.put(
-            url,
-            data=body,
-            headers={"Content-Type": "application/json"},
-        )
+        with self.limit():
+            response = self.session.put(
+                url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+            )
         self.status_code_or_raise(response, 204)
         return response
 
     def patch(self, url: str, data: Any) -> Response:
+        self.ensure_active_token()
         url = self.complete_url(url)
         body = app.json.dumps(data)
         app.logger.debug(f"PATCH {url}\n{body}")
-        response = self.session.patch(
-            url,
-            data=body,
-            headers={"Content-Type": "application/json"},
-        )
+        with self.limit():
+            response = self.session.patch(
+                url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+            )
         self.status_code_or_raise(response, 204)
         return response
 
     def delete(self, url: str) -> Response:
+        self.ensure_active_token()
         url = self.complete_url(url)
         app.logger.debug(f"DELETE {url}")
-        response = self.session.delete(url)
+        with self.limit():
+            response = self.session.delete(url)
         self.status_code_or_raise(response, 204)
         return response
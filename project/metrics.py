@@ -0,0 +1,157 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+run_duration = Histogram(
+    "ical_importer_run_duration_seconds",
+    "Duration of perform_run_task",
+    ["status"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+eventcally_request_duration = Histogram(
+    "ical_importer_eventcally_request_duration_seconds",
+    "Latency of eventcally API requests",
+    ["method", "route", "status"],
+)
+feed_download_duration = Histogram(
+    "ical_importer_feed_download_duration_seconds",
+    "Latency of feed downloads",
+    ["status"],
+)
+feed_download_size = Histogram(
+    "ical_importer_feed_download_size_bytes",
+    "Size of downloaded feeds",
+    buckets=(1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7),
+)
+events_processed = Counter(
+    "ical_importer_events_processed_total",
+    "Number of VEVENTs processed by runs",
+)
+events_per_second = Histogram(
+    "ical_importer_events_per_second",
+    "Number of VEVENTs processed per second of a run",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+eventcally_connections = Counter(
+    "ical_importer_eventcally_connections_total",
+    "Eventcally requests by whether they reused a pooled connection",
+    ["reused"],
+)
+eventcally_sessions = Counter(
+    "ical_importer_eventcally_sessions_total",
+    "Eventcally clients by whether they reused a pooled session",
+    ["reused"],
+)
+preview_duration = Histogram(
+    "ical_importer_preview_duration_seconds",
+    "Latency of the configuration preview endpoint",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+
+class CeleryQueueCollector:
+    def collect(self):
+        from project import app
+        from project.redis_client import get_redis
+
+        gauge = GaugeMetricFamily(
+            "ical_importer_celery_queue_depth",
+            "Number of messages waiting in the celery queue",
+            labels=["queue", "priority"],
+        )
+
+        if not app.config["REDIS_URL"]:
+            yield gauge
+            return
+
+        transport_options = app.config["CELERY_CONFIG"]["broker_transport_options"]
+        sep = transport_options["sep"]
+        redis = get_redis()
+
+        for queue in ["celery"]:
+            for priority in transport_options["priority_steps"]:
+                key = f"{queue}{sep}{priority}" if priority else queue
+                gauge.add_metric([queue, str(priority)], redis.llen(key))
+
+        yield gauge
+
+
+def is_multiprocess() -> bool:
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+queue_collector = CeleryQueueCollector()
+_registry = None
+
+
+def get_registry() -> CollectorRegistry:
+    global _registry
+
+    if is_multiprocess():
+        # Samples of all processes are read from the multiprocess directory
+        # on every scrape, so the registry has to be created freshly.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(queue_collector)
+        return registry
+
+    if _registry is None:
+        _registry = REGISTRY
+        _registry.register(queue_collector)
+
+    return _registry
+
+
+def generate_metrics() -> tuple:
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
+
+
+def start_worker_exporter(port: int):
+    start_http_server(port, registry=get_registry())
+
+
+def mark_process_dead(pid: int):
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
+
+
+def observe_eventcally_request(method: str, route: str, response):
+    eventcally_request_duration.labels(
+        method, route, str(response.status_code)
+    ).observe(response.elapsed.total_seconds())
+
+
+def observe_eventcally_connection(reused: bool):
+    eventcally_connections.labels(str(reused).lower()).inc()
+
+
+def observe_eventcally_session(reused: bool):
+    eventcally_sessions.labels(str(reused).lower()).inc()
+
+
+def observe_feed_download(response):
+    feed_download_duration.labels(str(response.status_code)).observe(
+        response.elapsed.total_seconds()
+    )
+
+    if response.status_code == 200:
+        feed_download_size.observe(len(response.content))
+
+
+def observe_run(run, vevent_count: int, duration: float):
+    status = run.status if run else "failure"
+    run_duration.labels(status).observe(duration)
+    events_processed.inc(vevent_count)
+
+    if duration > 0:
+        events_per_second.observe(vevent_count / duration)
@@ -1,15 +1,21 @@
 import datetime
+import random
 import uuid
+import zlib
 
 from flask import current_app
 from sqlalchemy import (
+    Boolean,
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Unicode,
     UnicodeText,
+    UniqueConstraint,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import backref, relationship
@@ -73,6 +79,14 @@ class Configuration(Base):
         "photo_url",
         "photo_copyright_text",
     ]
+    # Allowed (min, max) by integer attribute, None for no upper bound
+    _integer_attrs = {
+        "write_concurrency": (1, 32),
+        "run_retention_days": (1, None),
+        "import_window_past_days": (0, None),
+        "import_window_future_days": (0, None),
+    }
+    _log_verbosities = ["full", "changes", "failures"]
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer(), ForeignKey("user.id"), nullable=False)
     title = Column(Unicode(255))
@@ -99,11 +113,24 @@ class Configuration(Base):
     categories = Column(UnicodeText(), server_default='{{ standard["categories"] }}')
     tags = Column(UnicodeText(), server_default='{{ standard["tags"] }}')
 
+    feed_etag = Column(Unicode(255))
+    feed_last_modified = Column(Unicode(255))
+    feed_hash = Column(String(64))
+    feed_valid_until = Column(DateTime)  # UTC, skipping an unchanged feed
+    write_concurrency = Column(Integer())
+    log_verbosity = Column(String(255))  # full, changes, failures
+    run_interval = Column(Integer())  # minutes
+    next_run_at = Column(DateTime, index=True)
+    run_retention_days = Column(Integer())
+    import_window_past_days = Column(Integer())
+    import_window_future_days = Column(Integer())
+
     runs = relationship(
         "Run",
         primaryjoin="Configuration.id == Run.configuration_id",
         backref=backref("configuration", lazy=True),
         cascade="all, delete-orphan",
+        passive_deletes=True,
         order_by="Run.created_at.desc()",
     )
 
@@ -122,6 +149,38 @@ class Configuration(Base):
 
         super().__init__(*args, **kwargs)
 
+    def reset_feed_state(self):
+        self.feed_etag = None
+        self.feed_last_modified = None
+        self.feed_hash = None
+        self.feed_valid_until = None
+
+    def is_feed_state_expired(self) -> bool:
+        return (
+            self.feed_valid_until is not None
+            and self.feed_valid_until <= datetime.datetime.utcnow()
+        )
+
+    def reschedule(self, run=None):
+        config = current_app.config
+        interval = self.run_interval or config["RUN_INTERVAL_DEFAULT"]
+
+        if run and run.status == "success":
+            changed = not run.feed_unchanged and any(
+                [run.new_event_count, run.updated_event_count, run.deleted_event_count]
+            )
+            interval = interval / 2 if changed else interval * 1.5
+
+        interval = max(
+            config["RUN_INTERVAL_MIN"], min(config["RUN_INTERVAL_MAX"], interval)
+        )
+        jitter = random.uniform(-0.1, 0.1) * interval
+
+        self.run_interval = round(interval)
+        self.next_run_at = datetime.datetime.utcnow() + datetime.timedelta(
+            minutes=interval + jitter
+        )
+
 
 class ImportedEvent(Base):
     __tablename__ = "importedevent"
@@ -130,6 +189,7 @@ class ImportedEvent(Base):
     vevent_uid = Column(Unicode(255))
     eventcally_event_id = Column(Unicode(255))
     event = Column(JSONB)
+    fingerprint = Column(String(64))
 
     def get_eventcally_url(self):
         base_url = current_app.config["EVENTCALLY_URL"]
@@ -139,7 +199,9 @@ class ImportedEvent(Base):
 class Run(Base):
     __tablename__ = "run"
     id = Column(Integer, primary_key=True)
-    configuration_id = Column(Integer(), ForeignKey("configuration.id"), nullable=False)
+    configuration_id = Column(
+        Integer(), ForeignKey("configuration.id", ondelete="CASCADE"), nullable=False
+    )
     configuration_settings = Column(JSONB)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     status = Column(String(255))  # success, failure
@@ -149,12 +211,20 @@ class Run(Base):
     updated_event_count = Column(Integer)
     unchanged_event_count = Column(Integer)
     deleted_event_count = Column(Integer)
+    feed_unchanged = Column(Boolean)
+    metrics = Column(JSONB)
+    feed_snapshot_hash = Column(
+        String(64),
+        ForeignKey("feedsnapshot.hash", ondelete="SET NULL"),
+        index=True,
+    )
 
     log_entries = relationship(
         "LogEntry",
         primaryjoin="Run.id == LogEntry.run_id",
         backref=backref("run", lazy=True),
         cascade="all, delete-orphan",
+        passive_deletes=True,
         order_by="LogEntry.created_at",
     )
 
@@ -166,15 +236,42 @@ class Run(Base):
         self.updated_event_count = 0
         self.unchanged_event_count = 0
         self.deleted_event_count = 0
+        self.feed_unchanged = False
 
         super().__init__(*args, **kwargs)
 
 
 class LogEntry(Base):
     __tablename__ = "logentry"
+    __table_args__ = (
+        Index("ix_logentry_run_id_created_at", "run_id", "created_at", "id"),
+    )
+    _outcomes = ["failed", "skipped", "new", "updated", "deleted"]
     id = Column(Integer, primary_key=True)
-    run_id = Column(Integer(), ForeignKey("run.id"), nullable=False)
+    run_id = Column(Integer(), ForeignKey("run.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     message = Column(UnicodeText())
-    type = Column(String(255))  # vevent
+    type = Column(String(255))  # vevent, deleted, feed
+    outcome = Column(String(255))  # failed, skipped, new, updated, deleted
     context = Column(JSONB)
+
+
+class FeedSnapshot(Base):
+    __tablename__ = "feedsnapshot"
+    hash = Column(String(64), primary_key=True)  # sha256 of the feed
+    content = Column(LargeBinary, nullable=False)  # zlib compressed
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    def get_content(self) -> str:
+        return zlib.decompress(self.content).decode("utf-8")
+
+
+class EventcallyReference(Base):
+    __tablename__ = "eventcallyreference"
+    __table_args__ = (UniqueConstraint("organization_id", "kind", "name"),)
+    id = Column(Integer, primary_key=True)
+    organization_id = Column(Unicode(255), nullable=False)
+    kind = Column(String(255), nullable=False)  # place, organizer
+    name = Column(UnicodeText(), nullable=False)
+    eventcally_id = Column(Integer(), nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -0,0 +1,174 @@
+import datetime
+
+from dateutil import tz
+from dateutil.parser import isoparse
+from dateutil.rrule import rrulestr
+
+recurrence_line_names = ("RRULE", "RDATE", "EXDATE")
+local_format = "%Y%m%dT%H%M%S"
+
+
+def create_recurrence_rule(vevent, timezone: str) -> str:
+    """Creates eventcally's recurrence rule from the RRULE, RDATE and EXDATE
+    lines of a VEVENT.
+
+    eventcally expands the rule with a naive DTSTART in local time, so all
+    date values are converted to naive local date-times. Raises ValueError if
+    a line can not be converted.
+    """
+    local_tz = tz.gettz(timezone)
+    start = vevent.begin.datetime.astimezone(local_tz).replace(tzinfo=None)
+    lines = list()
+
+    for line in vevent.extra:
+        if line.name == "RRULE":
+            lines.append(f"RRULE:{_convert_rrule(line.value, local_tz)}")
+        elif line.name in ("RDATE", "EXDATE"):
+            values = [
+                _convert_date_value(value, line.params, start, local_tz)
+                for value in line.value.split(",")
+            ]
+            lines.append(f"{line.name}:{','.join(values)}")
+
+    return "\n".join(lines)
+
+
+def is_native_recurrence_rule(rule: str) -> bool:
+    # eventcally holds a single rule per date definition
+    return sum(1 for line in rule.splitlines() if line.startswith("RRULE:")) <= 1
+
+
+def validate_recurrence_rule(rule: str, start: datetime.datetime):
+    rrulestr(rule, forceset=True, dtstart=start)
+
+
+def expand_recurrence_rule(
+    rule: str,
+    start,
+    end,
+    allday: bool,
+    timezone: str,
+    limit: int,
+    horizon_days: int,
+    window_start: datetime.datetime = None,
+) -> tuple:
+    """Expands the rule into at most limit date definitions of occurrences
+    that end after window_start (default now) and start before the horizon.
+
+    Returns the date definitions and the aware date-time after which the
+    expansion differs, because the first occurrence has ended or the next one
+    reaches the horizon. The latter is None if the expansion never changes.
+    """
+    local_tz = tz.gettz(timezone)
+    start = _to_local(_parse_mapped_date(start), local_tz)
+    has_end = bool(end)
+    duration = _to_local(_parse_mapped_date(end), local_tz) - start if end else None
+
+    if duration is None:
+        duration = datetime.timedelta(days=1) if allday else datetime.timedelta()
+
+    occurrence_tz = start.tzinfo
+    now = datetime.datetime.now(local_tz).replace(tzinfo=None)
+    window_start = (
+        window_start.astimezone(local_tz).replace(tzinfo=None) if window_start else now
+    )
+    horizon = now + datetime.timedelta(days=horizon_days)
+    rule_set = rrulestr(rule, forceset=True, dtstart=start.replace(tzinfo=None))
+    date_definitions = list()
+    changes_at = None
+
+    # Occurrences that ended before the window start are skipped, so that a
+    # series that started long ago is not cut off by the limit.
+    for occurrence in rule_set.xafter(window_start - duration, inc=False):
+        if occurrence > horizon:
+            next_change = occurrence - datetime.timedelta(days=horizon_days)
+            changes_at = min(changes_at, next_change) if changes_at else next_change
+            break
+
+        if len(date_definitions) >= limit:
+            break
+
+        if not date_definitions:
+            changes_at = occurrence + duration
+
+        aware_occurrence = occurrence.replace(tzinfo=occurrence_tz)
+        date_definition = {
+            "start": _format_mapped_date(aware_occurrence, allday),
+            "allday": allday,
+        }
+
+        if has_end:
+            date_definition["end"] = _format_mapped_date(
+                aware_occurrence + duration, allday
+            )
+
+        date_definitions.append(date_definition)
+
+    if changes_at:
+        changes_at = changes_at.replace(tzinfo=local_tz)
+
+    return date_definitions, changes_at
+
+
+def _convert_rrule(value: str, local_tz) -> str:
+    parts = list()
+
+    for part in value.split(";"):
+        key, _, part_value = part.partition("=")
+
+        if key.upper() == "UNTIL" and part_value.endswith("Z"):
+            until = datetime.datetime.strptime(part_value, "%Y%m%dT%H%M%SZ")
+            until = until.replace(tzinfo=tz.UTC).astimezone(local_tz)
+            part_value = until.strftime(local_format)
+
+        parts.append(f"{key}={part_value}")
+
+    return ";".join(parts)
+
+
+def _convert_date_value(
+    value: str, params: dict, start: datetime.datetime, local_tz
+) -> str:
+    if "VALUE" in params and params["VALUE"][0] == "PERIOD":
+        raise ValueError(f"Unsupported period value {value}")
+
+    if len(value) == 8:
+        date = datetime.datetime.strptime(value, "%Y%m%d")
+        return datetime.datetime.combine(date, start.time()).strftime(local_format)
+
+    if value.endswith("Z"):
+        date = datetime.datetime.strptime(value, "%Y%m%dT%H%M%SZ")
+        date = date.replace(tzinfo=tz.UTC)
+    else:
+        date = datetime.datetime.strptime(value, local_format)
+
+        if "TZID" in params:
+            value_tz = tz.gettz(params["TZID"][0])
+
+            if not value_tz:
+                raise ValueError(f"Unknown TZID {params['TZID'][0]}")
+
+            date = date.replace(tzinfo=value_tz)
+
+    if date.tzinfo:
+        date = date.astimezone(local_tz).replace(tzinfo=None)
+
+    return date.strftime(local_format)
+
+
+def _to_local(value: datetime.datetime, local_tz) -> datetime.datetime:
+    return value.astimezone(local_tz) if value.tzinfo else value
+
+
+def _parse_mapped_date(value) -> datetime.datetime:
+    if isinstance(value, datetime.datetime):
+        return value
+
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+
+    return isoparse(str(value).replace(" ", "T"))
+
+
+def _format_mapped_date(value: datetime.datetime, allday: bool) -> str:
+    return str(value.date()) if allday else str(value)
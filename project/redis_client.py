@@ -0,0 +1,14 @@
+import redis
+
+_redis = None
+
+
+def get_redis() -> redis.Redis:
+    from project import app
+
+    global _redis
+
+    if _redis is None:
+        _redis = redis.Redis.from_url(app.config["REDIS_URL"])
+
+    return _redis
@@ -0,0 +1,70 @@
+import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from project import app, db
+from project.models import EventcallyReference
+
+
+class ReferenceCache:
+    def __init__(self, organization_id: str):
+        self.organization_id = organization_id
+        self._ids = dict()
+
+    def load(self):
+        due = datetime.datetime.utcnow() - datetime.timedelta(
+            days=app.config["REFERENCE_CACHE_TTL_DAYS"]
+        )
+        references = db.session.execute(
+            select(
+                EventcallyReference.kind,
+                EventcallyReference.name,
+                EventcallyReference.eventcally_id,
+            ).where(
+                EventcallyReference.organization_id == self.organization_id,
+                EventcallyReference.updated_at >= due,
+            )
+        )
+        self._ids = {(r.kind, r.name): r.eventcally_id for r in references}
+
+    def get(self, kind: str, name: str) -> int:
+        return self._ids.get((kind, name))
+
+    def store(self, kind: str, references: dict):
+        if not references:
+            return
+
+        now = datetime.datetime.utcnow()
+        values = [
+            {
+                "organization_id": self.organization_id,
+                "kind": kind,
+                "name": name,
+                "eventcally_id": eventcally_id,
+                "updated_at": now,
+            }
+            for name, eventcally_id in references.items()
+        ]
+        stmt = insert(EventcallyReference).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["organization_id", "kind", "name"],
+            set_={
+                "eventcally_id": stmt.excluded.eventcally_id,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.session.execute(stmt)
+
+        for name, eventcally_id in references.items():
+            self._ids[(kind, name)] = eventcally_id
+
+    def invalidate(self, kind: str, name: str):
+        self._ids.pop((kind, name), None)
+        db.session.execute(
+            delete(EventcallyReference).where(
+                EventcallyReference.organization_id == self.organization_id,
+                EventcallyReference.kind == kind,
+                EventcallyReference.name == name,
+            )
+        )
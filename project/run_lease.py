@@ -0,0 +1,139 @@
+import threading
+import uuid
+
+from project import app
+
+# Claims a missing key for a queued task. Returns the current value if any
+# other task already holds or claimed the configuration.
+_claim_script = """
+local value = redis.call("GET", KEYS[1])
+if value then
+    return value
+end
+redis.call("SET", KEYS[1], ARGV[1], "EX", ARGV[2])
+return false
+"""
+
+# Atomically turns a queued claim of the task (or a missing claim) into a
+# running lease. Fails if any other task holds or claimed the configuration.
+_acquire_script = """
+local value = redis.call("GET", KEYS[1])
+if value and value ~= ARGV[1] then
+    return 0
+end
+redis.call("SET", KEYS[1], ARGV[2], "EX", ARGV[3])
+return 1
+"""
+
+_extend_script = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("EXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_release_script = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class RunLease:
+    """Redis backed lease that allows only one run per configuration.
+
+    The value of the key is ``queued:<task_id>`` after a run has been enqueued
+    and ``running:<task_id>:<nonce>`` while it is performed. The nonce keeps a
+    redelivered copy of a task from taking over the lease of the original.
+    Without Redis (eager mode) every claim and acquire succeeds.
+    """
+
+    def __init__(self, configuration_id: int):
+        self.key = f"ical_importer:run_lease:{configuration_id}"
+        self.ttl = app.config["RUN_LEASE_TTL"]
+        self.queue_ttl = app.config["RUN_LEASE_QUEUE_TTL"]
+        self.value = None
+        self.holder_task_id = None
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat_thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(app.config["REDIS_URL"])
+
+    def _get_redis(self):
+        from project.redis_client import get_redis
+
+        return get_redis()
+
+    def get_task_id(self) -> str:
+        if not self.enabled:
+            return None
+
+        value = self._get_redis().get(self.key)
+        return self._parse_task_id(value) if value else None
+
+    def claim(self, task_id: str) -> bool:
+        """Claims the configuration for an enqueued task.
+
+        Returns False if another task already holds the configuration. Its id
+        is then available as holder_task_id.
+        """
+        self.holder_task_id = None
+
+        if not self.enabled:
+            return True
+
+        script = self._get_redis().register_script(_claim_script)
+        value = script(keys=[self.key], args=[f"queued:{task_id}", self.queue_ttl])
+
+        if value is None:
+            return True
+
+        self.holder_task_id = self._parse_task_id(value)
+        return False
+
+    def _parse_task_id(self, value: bytes) -> str:
+        return value.decode().split(":")[1]
+
+    def acquire(self, task_id: str) -> bool:
+        if not self.enabled:
+            return True
+
+        value = f"running:{task_id}:{uuid.uuid4().hex}"
+        script = self._get_redis().register_script(_acquire_script)
+
+        if not script(keys=[self.key], args=[f"queued:{task_id}", value, self.ttl]):
+            return False
+
+        self.value = value
+        self._start_heartbeat()
+        return True
+
+    def release(self):
+        if not self.enabled or not self.value:
+            return
+
+        self._stop_heartbeat.set()
+        self._heartbeat_thread.join()
+
+        script = self._get_redis().register_script(_release_script)
+        script(keys=[self.key], args=[self.value])
+        self.value = None
+
+    def _start_heartbeat(self):
+        self._stop_heartbeat.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._heartbeat_thread.start()
+
+    def _heartbeat(self):
+        script = self._get_redis().register_script(_extend_script)
+
+        while not self._stop_heartbeat.wait(self.ttl / 3):
+            try:
+                if not script(keys=[self.key], args=[self.value, self.ttl]):
+                    app.logger.warning(f"Lost run lease {self.key}")
+                    return
+            except Exception:
+                app.logger.exception(f"Heartbeat of run lease {self.key} failed")
@@ -0,0 +1,90 @@
+import hashlib
+import re
+
+from jinja2 import BaseLoader, Environment, Template
+
+from project import app
+from project.cache import LRUCache
+
+
+class TemplateCache:
+    def __init__(self, maxsize: int):
+        self.env = Environment(loader=BaseLoader())
+        self._cache = LRUCache(maxsize)
+
+    def get_template(self, source: str) -> Template:
+        if not isinstance(source, str):
+            return self.env.from_string(source)
+
+        key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        return self._cache.get_or_create(key, lambda: self.env.from_string(source))
+
+    def clear(self):
+        self._cache.clear()
+
+    def info(self) -> dict:
+        return self._cache.info()
+
+
+# Shared by all importers of a worker process
+template_cache = TemplateCache(app.config["TEMPLATE_CACHE_SIZE"])
+
+
+class MappingTemplate:
+    passthrough_regex = re.compile(
+        r"\{\{\s*standard\[\s*([\"'])(\w+)\1\s*\]\s*\}\}(?:\r\n|\r|\n)?"
+    )
+    template_markers = ("{{", "{%", "{#")
+    newline_regex = re.compile(r"\r\n|\r|\n")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.source_hash = hashlib.sha256(str(source).encode("utf-8")).hexdigest()
+        self.kind = "template"
+        self.standard_key = None
+        self.constant = None
+        self._template = None
+        self._error = None
+
+        if isinstance(source, str):
+            match = MappingTemplate.passthrough_regex.fullmatch(source)
+
+            if match:
+                self.kind = "passthrough"
+                self.standard_key = match.group(2)
+            elif not any(m in source for m in MappingTemplate.template_markers):
+                self.kind = "constant"
+                self.constant = self._normalize_constant(source)
+
+    def render(self, standard: dict, vevent) -> str:
+        if self.kind == "constant":
+            return self.constant
+
+        # Jinja falls back to attribute lookup for missing keys, so only keys
+        # that are actually present take the fast path.
+        if self.kind == "passthrough" and self.standard_key in standard:
+            return str(standard[self.standard_key])
+
+        return self._get_template().render(standard=standard, vevent=vevent)
+
+    def _get_template(self) -> Template:
+        if self._error:
+            raise self._error
+
+        if not self._template:
+            try:
+                self._template = template_cache.get_template(self.source)
+            except Exception as e:
+                self._error = e
+                raise
+
+        return self._template
+
+    def _normalize_constant(self, source: str) -> str:
+        # Same newline handling as the Jinja lexer with default settings
+        lines = MappingTemplate.newline_regex.split(source)
+
+        if lines[-1] == "":
+            del lines[-1]
+
+        return "\n".join(lines)
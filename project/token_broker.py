@@ -0,0 +1,101 @@
+import threading
+import time
+
+from sqlalchemy import select, update
+
+from project import app
+
+
+class TokenBroker:
+    """Refreshes OAuth tokens so that only one process refreshes the token of
+    a user at a time.
+
+    Refresh tokens are rotated by eventcally, so concurrent refreshes would
+    invalidate each other. The refresh is guarded by a Redis lock (a process
+    lock without Redis). Waiting processes use the token that was stored by
+    the refreshing process. Tokens are refreshed TOKEN_REFRESH_MARGIN seconds
+    before they expire.
+    """
+
+    def __init__(self):
+        self._local_locks = dict()
+        self._local_locks_lock = threading.Lock()
+
+    def ensure_active_token(self, session, user_id: int):
+        """Refreshes the token of the session if it expires soon.
+
+        The refreshed token is stored by the update_token hook of the session.
+        """
+        if not self._expires_soon(session.token):
+            return
+
+        with self._lock(user_id):
+            # Another process may have refreshed the token while waiting
+            stored_token = self.load_token(user_id)
+
+            if stored_token and not self._expires_soon(stored_token):
+                session.token = stored_token
+                return
+
+            session.refresh_token(
+                session.metadata.get("token_endpoint"),
+                refresh_token=session.token.get("refresh_token"),
+            )
+
+    def load_token(self, user_id: int) -> dict:
+        from project import db
+        from project.models import User
+
+        # Reads outside of the session, that may hold an outdated user
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(
+                    User.access_token,
+                    User.token_type,
+                    User.refresh_token,
+                    User.expires_at,
+                ).where(User.id == user_id)
+            ).first()
+
+        return row._asdict() if row else None
+
+    def store_token(self, user_id: int, token: dict):
+        from project import db
+        from project.models import User
+
+        # Commits independently of the session, that may hold the pending
+        # changes of a run
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values(
+                    access_token=token["access_token"],
+                    refresh_token=token.get("refresh_token"),
+                    expires_at=token["expires_at"],
+                )
+            )
+
+    def _expires_soon(self, token: dict) -> bool:
+        expires_at = token.get("expires_at") if token else None
+
+        if not expires_at:
+            return False
+
+        return expires_at - app.config["TOKEN_REFRESH_MARGIN"] < time.time()
+
+    def _lock(self, user_id: int):
+        if app.config["REDIS_URL"]:
+            from project.redis_client import get_redis
+
+            return get_redis().lock(
+                f"ical_importer:token_refresh:{user_id}",
+                timeout=app.config["TOKEN_REFRESH_LOCK_TIMEOUT"],
+                blocking_timeout=app.config["TOKEN_REFRESH_LOCK_TIMEOUT"],
+            )
+
+        with self._local_locks_lock:
+            return self._local_locks.setdefault(user_id, threading.Lock())
+
+
+token_broker = TokenBroker()
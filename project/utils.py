@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 
 from authlib.integrations.base_client.errors import OAuthError
@@ -43,12 +44,23 @@ def login_required(f):
 def token_check_required(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
-        from project import oauth
+        from project import db, oauth
+        from project.json_client import JsonClient
+
+        user = get_user()
+        client = JsonClient(oauth.eventcally, user)
 
         try:
-            oauth.eventcally.userinfo()
+            # Refreshes through the token broker, so that the web process
+            # does not race a worker that refreshes the same token.
+            client.ensure_active_token()
+            oauth.eventcally.userinfo(token=client.session.token)
         except OAuthError:
             abort(401)
+        finally:
+            client.close()
+
+        db.session.refresh(user)
 
         return f(*args, **kwargs)
 
@@ -66,3 +78,17 @@ def set_env_to_app(app: Flask, key: str, default: str = None):
 
     if default:
         app.config[key] = default
+
+
+def map_concurrently(func, items: list, max_workers: int) -> list:
+    from project import app
+
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    def run_with_app_context(item):
+        with app.app_context():
+            return func(item)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(run_with_app_context, items))
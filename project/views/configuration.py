@@ -1,7 +1,11 @@
-from flask import redirect, render_template, request, url_for
+import datetime
+
+from flask import abort, redirect, render_template, request, url_for
+from sqlalchemy import tuple_
 
 from project import app, current_user, db
-from project.models import Configuration, Run
+from project.metrics import preview_duration
+from project.models import Configuration, LogEntry, Run
 from project.utils import login_required, token_check_required
 
 
@@ -40,19 +44,92 @@ def configuration(id):
 @app.route("/configurations/<configuration_id>/runs/<run_id>")
 @login_required
 def run(configuration_id, run_id):
-    run = Run.query.get_or_404(run_id)
-
-    configuration = Configuration.query.filter(
-        Configuration.id == configuration_id,
-        Configuration.user_id == current_user.id,
-    ).first_or_404(id)
+    run = get_run_or_404(configuration_id, run_id)
+    configuration = run.configuration
 
     return render_template(
         "runs/read.html",
         configuration=configuration,
         run=run,
+        log_entry_types=["vevent", "deleted", "feed"],
+        log_entry_outcomes=LogEntry._outcomes,
+    )
+
+
+def get_run_or_404(configuration_id, run_id) -> Run:
+    return (
+        Run.query.join(Configuration)
+        .filter(
+            Run.id == run_id,
+            Configuration.id == configuration_id,
+            Configuration.user_id == current_user.id,
+        )
+        .first_or_404()
+    )
+
+
+@app.route("/configurations/<configuration_id>/runs/<run_id>/log_entries")
+@login_required
+def run_log_entries(configuration_id, run_id):
+    from project.api import LogEntrySchema
+
+    run = get_run_or_404(configuration_id, run_id)
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+
+    query = LogEntry.query.filter(LogEntry.run_id == run.id)
+
+    if request.args.get("type"):
+        query = query.filter(LogEntry.type.in_(request.args["type"].split(",")))
+
+    if request.args.get("outcome"):
+        query = query.filter(LogEntry.outcome.in_(request.args["outcome"].split(",")))
+
+    if request.args.get("after"):
+        try:
+            created_at, id = request.args["after"].split("|")
+            after = (datetime.datetime.fromisoformat(created_at), int(id))
+        except ValueError:
+            abort(400)
+
+        query = query.filter(tuple_(LogEntry.created_at, LogEntry.id) > after)
+
+    log_entries = (
+        query.with_entities(
+            LogEntry.id,
+            LogEntry.created_at,
+            LogEntry.message,
+            LogEntry.type,
+            LogEntry.outcome,
+        )
+        .order_by(LogEntry.created_at, LogEntry.id)
+        .limit(limit + 1)
+        .all()
     )
 
+    next = None
+    if len(log_entries) > limit:
+        log_entries = log_entries[:limit]
+        last = log_entries[-1]
+        next = f"{last.created_at.isoformat()}|{last.id}"
+
+    schema = LogEntrySchema(many=True, exclude=("context",))
+    return {"items": schema.dump(log_entries), "next": next}
+
+
+@app.route(
+    "/configurations/<configuration_id>/runs/<run_id>/log_entries/<log_entry_id>"
+)
+@login_required
+def run_log_entry(configuration_id, run_id, log_entry_id):
+    from project.api import LogEntrySchema
+
+    run = get_run_or_404(configuration_id, run_id)
+    log_entry = LogEntry.query.filter(
+        LogEntry.id == log_entry_id, LogEntry.run_id == run.id
+    ).first_or_404()
+
+    return LogEntrySchema().dump(log_entry)
+
 
 @app.route("/configurations/<id>/update")
 @login_required
@@ -76,7 +153,29 @@ def configurations_update_js_save(id):
         Configuration.user_id == current_user.id,
     ).first_or_404(id)
 
-    configuration.update_with_kwargs(**request.form)
+    kwargs = request.form.to_dict()
+
+    for attr, (min_value, max_value) in Configuration._integer_attrs.items():
+        if attr not in kwargs:
+            continue
+
+        if not kwargs[attr]:
+            kwargs[attr] = None
+            continue
+
+        try:
+            value = int(kwargs[attr])
+        except ValueError:
+            return f"{attr} must be a number", 400
+
+        if value < min_value or (max_value is not None and value > max_value):
+            bounds = f"{min_value}..{max_value}" if max_value else f">= {min_value}"
+            return f"{attr} must be {bounds}", 400
+
+        kwargs[attr] = value
+
+    configuration.update_with_kwargs(**kwargs)
+    configuration.reset_feed_state()
     db.session.commit()
 
     return ""
@@ -98,9 +197,16 @@ def configurations_update_js_delete(id):
 
 @app.route("/configurations/<id>/update/js/preview", methods=["POST"])
 @login_required
+@preview_duration.time()
 def configurations_update_js_preview(id):
-    from project.api import RunSchema
-    from project.ical_importer import IcalImporter
+    import arrow
+
+    from project.api import LogEntrySchema, RunSchema
+    from project.ical_importer import (
+        IcalImporter,
+        preview_feed_cache,
+        preview_render_cache,
+    )
 
     configuration = Configuration.query.filter(
         Configuration.id == id,
@@ -117,10 +223,36 @@ def configurations_update_js_preview(id):
 
     importer = IcalImporter()
     importer.dry = True
+    importer.feed_cache = preview_feed_cache
+    importer.render_cache = preview_render_cache
+    vevent_limit = request.form.get(
+        "preview_limit", app.config["PREVIEW_EVENT_LIMIT"], type=int
+    )
+    importer.vevent_limit = max(1, min(vevent_limit, 500))
+
+    if request.form.get("preview_start") and request.form.get("preview_end"):
+        try:
+            importer.vevent_window = (
+                arrow.get(request.form["preview_start"]),
+                arrow.get(request.form["preview_end"]).shift(days=1),
+            )
+        except ValueError:
+            return "preview_start and preview_end must be dates", 400
+
+    # Only the values of the changed field are returned
+    if request.form.get("changed_field") in Configuration._mapper_attrs:
+        importer.changed_field = request.form["changed_field"]
+
+    if request.form.get("preview_reload"):
+        preview_feed_cache.delete(configuration.url)
+
     importer.perform(configuration)
 
     schema = RunSchema()
     result = schema.dump(importer.run)
+    result["log_entries"] = LogEntrySchema(many=True).dump(importer.log_entries)
+    result["event_count"] = importer.vevent_count
+    result["total_event_count"] = importer.vevent_total_count
     return result
 
 
@@ -128,8 +260,11 @@ def configurations_update_js_preview(id):
 @login_required
 @token_check_required
 def configurations_update_js_import(id):
+    from celery import uuid
+
     from project.celery import get_celery_poll_result
     from project.celery_tasks import perform_run_task
+    from project.run_lease import RunLease
 
     configuration = Configuration.query.filter(
         Configuration.id == id,
@@ -139,5 +274,12 @@ def configurations_update_js_import(id):
     if "poll" in request.args:
         return get_celery_poll_result(request.args["poll"])
 
-    result = perform_run_task.delay(configuration.id)
+    # Attaches to the run that is already queued or running
+    task_id = uuid()
+    lease = RunLease(configuration.id)
+
+    if not lease.claim(task_id):
+        return {"id": lease.holder_task_id}
+
+    result = perform_run_task.apply_async((configuration.id,), task_id=task_id)
     return {"id": result.id}
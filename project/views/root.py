@@ -1,6 +1,14 @@
-from flask import redirect, render_template, request, send_from_directory, url_for
+from flask import (
+    Response,
+    redirect,
+    render_template,
+    request,
+    send_from_directory,
+    url_for,
+)
 
 from project import app, current_user
+from project.metrics import generate_metrics
 
 
 @app.route("/")
@@ -14,3 +22,9 @@ def index():
 @app.route("/favicon.ico")
 def favicon_ico():
     return send_from_directory(app.static_folder, request.path[1:])
+
+
+@app.route("/metrics")
+def metrics():
+    data, content_type = generate_metrics()
+    return Response(data, content_type=content_type)
@@ -0,0 +1,125 @@
+import os
+import pathlib
+
+import pytest
+
+os.environ["DATABASE_URL"] = os.environ.get(
+    "TEST_DATABASE_URL",
+    "postgresql://postgres@localhost/eventcally_ical_importer_tests",
+)
+os.environ.setdefault("EVENTCALLY_URL", "http://127.0.0.1")
+os.environ.pop("REDIS_URL", None)
+
+
+@pytest.fixture
+def app():
+    from project import app, db
+    from project.json_client import session_pool
+
+    app.config["TESTING"] = True
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        yield app
+
+        session_pool.clear()
+        db.session.rollback()
+        db.session.remove()
+
+
+@pytest.fixture
+def db(app):
+    from project import db
+
+    return db
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def redis(app, monkeypatch):
+    import fakeredis
+
+    from project import redis_client
+
+    server = fakeredis.FakeRedis()
+    monkeypatch.setitem(app.config, "REDIS_URL", "redis://localhost")
+    monkeypatch.setattr(redis_client, "_redis", server)
+    return server
+
+
+@pytest.fixture
+def fake_eventcally():
+    from project.benchmark.fake_eventcally import FakeEventcally
+
+    server = FakeEventcally()
+    server.start()
+    server.feed = (pathlib.Path(__file__).parent / "goslar-sitzung.ical").read_text()
+
+    yield server
+
+    server.stop()
+
+
+@pytest.fixture
+def create_json_client(fake_eventcally):
+    from project import oauth
+    from project.json_client import JsonClient
+
+    def create(user):
+        base_url = fake_eventcally.base_url
+        oauth_client = oauth.register(
+            f"eventcally_test_{base_url.rsplit(':', 1)[1]}",
+            client_id="test",
+            client_secret="test",
+            api_base_url=base_url,
+            server_metadata_url=f"{base_url}/.well-known/openid-configuration",
+        )
+        return JsonClient(oauth_client, user)
+
+    return create
+
+
+class Seeder:
+    def __init__(self, db):
+        self.db = db
+
+    def create_user(self, email="test@test.de") -> int:
+        import time
+
+        from project.models import User
+
+        user = User(
+            email=email,
+            token_type="Bearer",
+            access_token="access",
+            refresh_token="refresh",
+            expires_at=int(time.time()) + 86400,
+        )
+        self.db.session.add(user)
+        self.db.session.commit()
+        return user.id
+
+    def create_configuration(self, user_id: int, url: str, **kwargs) -> int:
+        from project.models import Configuration
+
+        configuration = Configuration(
+            user_id=user_id, title="Test", url=url, organization_id="1", **kwargs
+        )
+        self.db.session.add(configuration)
+        self.db.session.commit()
+        return configuration.id
+
+    def login(self, client, user_id: int):
+        with client.session_transaction() as session:
+            session["user_id"] = user_id
+
+
+@pytest.fixture
+def seeder(db):
+    return Seeder(db)
@@ -0,0 +1,40 @@
+import pytest
+
+
+@pytest.mark.parametrize("with_page_count", [True, False])
+def test_find_events_by_tag_or_internal_tag(
+    db, seeder, fake_eventcally, create_json_client, monkeypatch, with_page_count
+):
+    from project.api_client import ApiClient
+    from project.models import User
+
+    for id in range(1, 9):
+        fake_eventcally.events[id] = {
+            "id": id,
+            "tags": "x" if id <= 5 else "",
+            "internal_tags": "x" if 4 <= id <= 7 else "",
+        }
+
+    user = db.session.get(User, seeder.create_user())
+    api_client = ApiClient(create_json_client(user))
+    api_client.organization_id = "1"
+    api_client.per_page = 2
+
+    if not with_page_count:
+        search_events = api_client._search_events
+
+        def search_events_without_page_count(field, tag, page):
+            pagination = search_events(field, tag, page)
+            del pagination["pages"]
+            del pagination["total"]
+            return pagination
+
+        monkeypatch.setattr(
+            api_client, "_search_events", search_events_without_page_count
+        )
+
+    events = api_client.find_events_by_tag_or_internal_tag("x")
+
+    # Events that carry the tag in both fields are returned once
+    assert sorted(e["id"] for e in events) == [1, 2, 3, 4, 5, 6, 7]
+    assert fake_eventcally.calls[("search", "GET")] == 5
@@ -0,0 +1,114 @@
+import datetime
+
+
+def test_schedule_runs_task(app, db, seeder, redis, monkeypatch):
+    from project.celery_tasks import perform_runs_task, schedule_runs_task
+    from project.models import Configuration
+    from project.run_lease import RunLease
+
+    monkeypatch.setitem(app.config, "SCHEDULE_CHUNK_SIZE", 2)
+    monkeypatch.setitem(app.config, "RUN_CONCURRENCY", 2)
+    dispatched = list()
+    monkeypatch.setattr(
+        perform_runs_task,
+        "apply_async",
+        lambda args, task_id, countdown: dispatched.append((args[0], countdown)),
+    )
+
+    now = datetime.datetime.utcnow()
+    user_id = seeder.create_user()
+    due_ids = [
+        seeder.create_configuration(user_id, url)
+        for url in ("http://a", "http://b", "http://a", "http://c")
+    ]
+    leased_id = seeder.create_configuration(
+        user_id, "http://d", next_run_at=now - datetime.timedelta(minutes=1)
+    )
+    future_id = seeder.create_configuration(
+        user_id, "http://e", next_run_at=now + datetime.timedelta(hours=1)
+    )
+    assert RunLease(leased_id).claim("other")
+
+    schedule_runs_task.apply()
+
+    # Every chunk of due configurations is dispatched, except the one whose
+    # run is still queued
+    assert [ids for ids, _ in dispatched] == [
+        [due_ids[0], due_ids[1]],
+        [due_ids[2], due_ids[3]],
+    ]
+    assert all(RunLease(id).get_task_id() for id in due_ids)
+    assert RunLease(leased_id).get_task_id() == "other"
+
+    # Configurations with the same URL start together across chunks
+    countdowns = {id: c for ids, c in dispatched for id in ids}
+    assert countdowns[due_ids[0]] == countdowns[due_ids[2]]
+
+    db.session.expire_all()
+    interval = datetime.timedelta(minutes=app.config["RUN_INTERVAL_DEFAULT"])
+
+    for id in due_ids + [leased_id]:
+        next_run_at = db.session.get(Configuration, id).next_run_at
+        assert next_run_at >= now + interval - datetime.timedelta(seconds=1)
+
+    future = db.session.get(Configuration, future_id)
+    assert future.next_run_at < now + datetime.timedelta(hours=2)
+
+    # Bumped configurations are not dispatched again
+    dispatched.clear()
+    schedule_runs_task.apply()
+    assert dispatched == []
+
+
+def test_delete_outdated_runs_task(app, db, seeder, monkeypatch):
+    from project.celery_tasks import delete_outdated_runs_task
+    from project.models import FeedSnapshot, LogEntry, Run
+
+    monkeypatch.setitem(app.config, "PURGE_BATCH_SIZE", 1)
+    now = datetime.datetime.utcnow()
+    month_ago = now - datetime.timedelta(days=30)
+    two_days_ago = now - datetime.timedelta(days=2)
+
+    for hash, created_at in (
+        ("kept", month_ago),
+        ("purged", month_ago),
+        ("unreferenced", month_ago),
+        ("recent", now),
+    ):
+        db.session.add(FeedSnapshot(hash=hash, content=b"", created_at=created_at))
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(user_id, "http://localhost")
+    short_retention_id = seeder.create_configuration(
+        user_id, "http://localhost", run_retention_days=1
+    )
+    runs = {
+        "old": Run(
+            configuration_id=configuration_id,
+            created_at=month_ago,
+            feed_snapshot_hash="purged",
+        ),
+        "recent": Run(
+            configuration_id=configuration_id,
+            created_at=two_days_ago,
+            feed_snapshot_hash="kept",
+        ),
+        "short_retention": Run(
+            configuration_id=short_retention_id, created_at=two_days_ago
+        ),
+    }
+
+    for run in runs.values():
+        run.log_entries = [LogEntry(message="1"), LogEntry(message="2")]
+        db.session.add(run)
+
+    db.session.commit()
+    recent_id = runs["recent"].id
+
+    delete_outdated_runs_task.apply()
+    db.session.expire_all()
+
+    assert [run.id for run in Run.query.all()] == [recent_id]
+    assert {entry.run_id for entry in LogEntry.query.all()} == {recent_id}
+    assert LogEntry.query.count() == 2
+    assert {s.hash for s in FeedSnapshot.query.all()} == {"kept", "recent"}
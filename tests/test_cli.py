@@ -0,0 +1,45 @@
+def test_configuration_replay(app, db, seeder, fake_eventcally, create_json_client):
+    from project.api_client import ApiClient
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration, FeedSnapshot
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(
+        user_id, f"{fake_eventcally.base_url}/feed.ics"
+    )
+    configuration = db.session.get(Configuration, configuration_id)
+
+    importer = IcalImporter()
+    importer.dry = False
+    importer.api_client = ApiClient(create_json_client(configuration.user))
+    importer.api_client.organization_id = configuration.organization_id
+    importer.perform(configuration)
+    db.session.commit()
+
+    run_id = importer.run.id
+    assert db.session.get(FeedSnapshot, importer.run.feed_snapshot_hash)
+
+    # The replay neither downloads the feed nor calls the API
+    fake_eventcally.stop()
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["configuration", "replay", str(run_id)])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith("success: 84 events")
+
+    result = runner.invoke(args=["configuration", "replay", str(run_id), "--json"])
+    assert result.exit_code == 0, result.output
+    assert len(app.json.loads(result.output)) == 84
+
+    result = runner.invoke(args=["configuration", "replay", str(run_id), "--profile"])
+    assert result.exit_code == 0, result.output
+    assert "cumulative" in result.output
+
+
+def test_configuration_replay_without_snapshot(app):
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["configuration", "replay", "1"])
+
+    assert result.exit_code == 1
+    assert "has no feed snapshot" in result.output
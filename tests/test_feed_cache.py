@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+
+
+def create_feed(content: str) -> dict:
+    return {
+        "content": content,
+        "hash": content,
+        "etag": None,
+        "last_modified": None,
+    }
+
+
+@pytest.mark.parametrize("use_redis", [False, True])
+def test_fetch_shares_download(app, request, use_redis):
+    from project.feed_cache import SharedFeedCache
+
+    if use_redis:
+        request.getfixturevalue("redis")
+
+    cache = SharedFeedCache()
+    downloads = list()
+    feeds = list()
+
+    def download():
+        downloads.append(threading.current_thread())
+        time.sleep(0.2)
+        return create_feed("BEGIN:VCALENDAR")
+
+    def fetch():
+        with app.app_context():
+            feeds.append(cache.fetch("http://localhost/feed.ics", download))
+
+    # Threads that wait for the per-URL lock read the downloaded feed
+    threads = [threading.Thread(target=fetch) for _ in range(3)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert len(downloads) == 1
+    assert feeds == [create_feed("BEGIN:VCALENDAR")] * 3
+
+    other = cache.fetch("http://localhost/other.ics", lambda: create_feed("other"))
+    assert other == create_feed("other")
+    assert len(downloads) == 1
+
+
+def test_parse_by_hash(app):
+    from project.feed_cache import SharedFeedCache
+
+    cache = SharedFeedCache()
+    parsed = list()
+
+    def parse(content):
+        parsed.append(content)
+        return content, None
+
+    assert cache.parse(create_feed("a"), parse) == ("a", None)
+    assert cache.parse(create_feed("a"), parse) == ("a", None)
+    assert cache.parse(create_feed("b"), parse) == ("b", None)
+    assert parsed == ["a", "b"]
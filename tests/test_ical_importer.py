@@ -0,0 +1,374 @@
+def test_perform_dry(db, seeder, fake_eventcally, create_json_client):
+    from project.api_client import ApiClient
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(
+        user_id, f"{fake_eventcally.base_url}/feed.ics"
+    )
+    configuration = db.session.get(Configuration, configuration_id)
+
+    importer = IcalImporter()
+    importer.dry = True
+    importer.api_client = ApiClient(create_json_client(configuration.user))
+    importer.perform(configuration)
+
+    assert importer.run.status == "success"
+    assert importer.vevent_count == 84
+    assert importer.run.failure_event_count == 0
+    assert len(importer.log_entries) == 84
+    assert importer.reference_cache is None
+    assert fake_eventcally.events == dict()
+
+
+def test_limit_log_context_size(app, monkeypatch):
+    from project.ical_importer import IcalImporter
+
+    monkeypatch.setitem(app.config, "LOG_ENTRY_MAX_CONTEXT_SIZE", 1000)
+    context = {
+        "vevent": "x" * 800,
+        "standard": {"name": "y" * 900},
+        "event": {"name": "z"},
+        "errors": [],
+    }
+
+    context = IcalImporter()._limit_log_context_size(context)
+
+    assert context["vevent"] == "[truncated]"
+    assert context["standard"] == "[truncated]"
+    assert context["event"] == {"name": "z"}
+    assert context["truncated"]
+    assert len(app.json.dumps(context)) <= 1000
+
+    context = IcalImporter()._limit_log_context_size({"vevent": "x" * 100})
+    assert "truncated" not in context
+
+
+def test_delete_failure_outcome(db, seeder):
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration, ImportedEvent, Run
+
+    class FailingApiClient:
+        def delete_event(self, eventcally_event_id):
+            raise ValueError("Expected 204, but was 500")
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(user_id, "http://localhost")
+    configuration = db.session.get(Configuration, configuration_id)
+    configuration.imported_events.append(
+        ImportedEvent(vevent_uid="1", eventcally_event_id="1", event=dict())
+    )
+
+    importer = IcalImporter()
+    importer.dry = False
+    importer.configuration = configuration
+    importer.run = Run(status="success")
+    importer.api_client = FailingApiClient()
+    importer.uids_to_import = set()
+    importer._delete_non_existing_events_from_eventcally()
+
+    assert importer.run.status == "failure"
+    assert importer.run.failure_event_count == 1
+    assert importer.run.deleted_event_count == 0
+    assert importer.log_entries[0]["outcome"] == "failed"
+    assert len(configuration.imported_events) == 1
+
+
+def test_perform_dry_expands_recurrence_rules(
+    db, seeder, fake_eventcally, create_json_client
+):
+    import datetime
+
+    from project.api_client import ApiClient
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration
+
+    fake_eventcally.feed = "\r\n".join(
+        [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:test",
+            "X-WR-CALNAME:Test",
+            "BEGIN:VEVENT",
+            "UID:series",
+            "DTSTART:20150105T090000Z",
+            "DTEND:20150105T100000Z",
+            "RRULE:FREQ=WEEKLY;BYDAY=MO",
+            "RRULE:FREQ=WEEKLY;BYDAY=TH",
+            "SUMMARY:Series",
+            "LOCATION:Place",
+            "END:VEVENT",
+            "BEGIN:VEVENT",
+            "UID:open",
+            "DTSTART:20150105T090000Z",
+            "RRULE:FREQ=DAILY",
+            "RRULE:FREQ=WEEKLY",
+            "SUMMARY:Open",
+            "LOCATION:Place",
+            "END:VEVENT",
+            "BEGIN:VEVENT",
+            "UID:ended",
+            "DTSTART:20150105T090000Z",
+            "RRULE:FREQ=DAILY;COUNT=2",
+            "RRULE:FREQ=WEEKLY;COUNT=2",
+            "SUMMARY:Ended",
+            "LOCATION:Place",
+            "END:VEVENT",
+            "END:VCALENDAR",
+        ]
+    )
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(
+        user_id, f"{fake_eventcally.base_url}/feed.ics"
+    )
+    configuration = db.session.get(Configuration, configuration_id)
+
+    importer = IcalImporter()
+    importer.dry = True
+    importer.api_client = ApiClient(create_json_client(configuration.user))
+    importer.perform(configuration)
+
+    contexts = {e["context"]["vevent_uid"]: e["context"] for e in importer.log_entries}
+    recurrence_dates = contexts["series"]["event"]["recurrence_dates"]
+    start = datetime.datetime.fromisoformat(recurrence_dates[0]["start"])
+    end = datetime.datetime.fromisoformat(recurrence_dates[0]["end"])
+    assert start.date() >= datetime.date.today()
+    # Occurrences keep the local time of DTSTART, 09:00 UTC in winter
+    assert start.time() == datetime.time(10)
+    assert end - start == datetime.timedelta(hours=1)
+    assert not recurrence_dates[0]["allday"]
+
+    recurrence_dates = contexts["open"]["event"]["recurrence_dates"]
+    start = datetime.datetime.fromisoformat(recurrence_dates[0]["start"])
+    assert start.time() == datetime.time(10)
+    assert recurrence_dates[0]["end"] == recurrence_dates[0]["start"]
+    assert contexts["ended"]["event"]["recurrence_dates"] == []
+    assert [h["key"] for h in contexts["ended"]["hints"]] == ["recurrence_rule"]
+    assert importer.feed_valid_until > datetime.datetime.utcnow()
+
+
+def test_import_window_limits_feed_validity(
+    db, seeder, fake_eventcally, create_json_client
+):
+    import datetime
+
+    from project.api_client import ApiClient
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration
+
+    start = datetime.datetime.utcnow() + datetime.timedelta(days=60)
+    fake_eventcally.feed = "\r\n".join(
+        [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:test",
+            "X-WR-CALNAME:Test",
+            "BEGIN:VEVENT",
+            "UID:later",
+            f"DTSTART:{start.strftime('%Y%m%dT%H%M%SZ')}",
+            "SUMMARY:Later",
+            "LOCATION:Place",
+            "END:VEVENT",
+            "END:VCALENDAR",
+        ]
+    )
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(
+        user_id,
+        f"{fake_eventcally.base_url}/feed.ics",
+        import_window_future_days=30,
+    )
+    configuration = db.session.get(Configuration, configuration_id)
+
+    importer = IcalImporter()
+    importer.dry = True
+    importer.api_client = ApiClient(create_json_client(configuration.user))
+    importer.perform(configuration)
+
+    assert importer.vevent_count == 0
+    assert importer.uids_outside_window == {"later"}
+    valid_until = start.replace(microsecond=0) - datetime.timedelta(days=30)
+    assert importer.feed_valid_until == valid_until
+
+    importer.feed_hash = "hash"
+    importer._store_feed_state()
+    assert configuration.feed_hash == "hash"
+    assert configuration.feed_valid_until == valid_until
+    assert not configuration.is_feed_state_expired()
+
+    configuration.feed_valid_until = datetime.datetime.utcnow()
+    assert configuration.is_feed_state_expired()
+
+
+def test_perform(db, seeder, fake_eventcally, create_json_client):
+    from project.api_client import ApiClient
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(
+        user_id, f"{fake_eventcally.base_url}/feed.ics"
+    )
+    configuration = db.session.get(Configuration, configuration_id)
+
+    importer = IcalImporter()
+    importer.dry = False
+    importer.api_client = ApiClient(create_json_client(configuration.user))
+    importer.api_client.organization_id = configuration.organization_id
+    importer.perform(configuration)
+    db.session.commit()
+
+    assert importer.run.status == "success"
+    assert importer.run.new_event_count == 84
+    assert len(fake_eventcally.events) == 84
+    assert len(configuration.imported_events) == 84
+    assert configuration.feed_hash
+
+    importer = IcalImporter()
+    importer.dry = False
+    importer.api_client = ApiClient(create_json_client(configuration.user))
+    importer.api_client.organization_id = configuration.organization_id
+    importer.perform(configuration)
+
+    assert importer.run.status == "success"
+    assert importer.run.feed_unchanged
+
+
+def test_perform_feed_not_found(db, seeder, fake_eventcally, create_json_client):
+    from project.api_client import ApiClient
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration, FeedSnapshot
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(
+        user_id, f"{fake_eventcally.base_url}/missing.ics"
+    )
+    configuration = db.session.get(Configuration, configuration_id)
+
+    importer = IcalImporter()
+    importer.dry = False
+    importer.api_client = ApiClient(create_json_client(configuration.user))
+    importer.api_client.organization_id = configuration.organization_id
+    importer.perform(configuration)
+    db.session.commit()
+
+    assert importer.run.status == "failure"
+    assert importer.run.feed_snapshot_hash is None
+    assert FeedSnapshot.query.count() == 0
+    assert configuration.feed_hash is None
+
+
+def test_perform_skips_unchanged_vevents(
+    db, seeder, fake_eventcally, create_json_client
+):
+    from project.api_client import ApiClient
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(
+        user_id, f"{fake_eventcally.base_url}/feed.ics"
+    )
+    configuration = db.session.get(Configuration, configuration_id)
+
+    def perform():
+        importer = IcalImporter()
+        importer.dry = False
+        importer.api_client = ApiClient(create_json_client(configuration.user))
+        importer.api_client.organization_id = configuration.organization_id
+        importer.perform(configuration)
+        db.session.commit()
+        return importer
+
+    perform()
+
+    # The feed was regenerated, but none of its events changed
+    fake_eventcally.feed = fake_eventcally.feed.replace(
+        "DTSTAMP:20240120T104409Z", "DTSTAMP:20240121T104409Z"
+    )
+    fake_eventcally.calls.clear()
+    importer = perform()
+
+    assert importer.run.status == "success"
+    assert not importer.run.feed_unchanged
+    assert importer.run.unchanged_event_count == 84
+    assert importer.run.updated_event_count == 0
+    assert fake_eventcally.calls[("event", "PUT")] == 0
+    assert fake_eventcally.calls[("events", "POST")] == 0
+
+
+def test_perform_invalidates_deleted_references(
+    db, seeder, fake_eventcally, create_json_client
+):
+    from project.api_client import ApiClient
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration, EventcallyReference
+
+    user_id = seeder.create_user()
+
+    def perform(url):
+        configuration = db.session.get(
+            Configuration, seeder.create_configuration(user_id, url)
+        )
+        importer = IcalImporter()
+        importer.dry = False
+        importer.api_client = ApiClient(create_json_client(configuration.user))
+        importer.api_client.organization_id = configuration.organization_id
+        importer.perform(configuration)
+        db.session.commit()
+        return importer
+
+    perform(f"{fake_eventcally.base_url}/feed.ics")
+    organizers = {
+        (r.name, r.eventcally_id, r.updated_at)
+        for r in EventcallyReference.query.filter_by(kind="organizer")
+    }
+
+    # The cached places were deleted in eventcally
+    fake_eventcally.references["places"].clear()
+    importer = perform(f"{fake_eventcally.base_url}/feed.ics?other")
+
+    assert importer.run.status == "success"
+    assert importer.run.new_event_count == 84
+    assert fake_eventcally.references["places"]
+    assert importer.invalidated_references == set()
+    assert importer.cached_references
+    assert all(kind == "organizer" for kind, _ in importer.cached_references)
+
+    # Organizers were not named by the errors and stay cached
+    db.session.expire_all()
+    assert organizers == {
+        (r.name, r.eventcally_id, r.updated_at)
+        for r in EventcallyReference.query.filter_by(kind="organizer")
+    }
+
+
+def test_run_metrics_template_cache(db, seeder, fake_eventcally, create_json_client):
+    from project.api_client import ApiClient
+    from project.ical_importer import IcalImporter
+    from project.models import Configuration
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(
+        user_id,
+        f"{fake_eventcally.base_url}/feed.ics",
+        name='{{ standard["name"] | upper }}',
+    )
+    configuration = db.session.get(Configuration, configuration_id)
+
+    def perform():
+        importer = IcalImporter()
+        importer.dry = True
+        importer.api_client = ApiClient(create_json_client(configuration.user))
+        importer.perform(configuration)
+        return importer.run.metrics["template_cache"]
+
+    info = perform()
+    assert info["hits"] + info["misses"] == 1
+
+    # Only the lookups of the run are counted
+    info = perform()
+    assert info["hits"] == 1
+    assert info["misses"] == 0
+    assert info["size"] >= 1
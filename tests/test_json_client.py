@@ -0,0 +1,49 @@
+def test_get(db, seeder, create_json_client):
+    from project.models import User
+
+    user = db.session.get(User, seeder.create_user())
+    json_client = create_json_client(user)
+
+    response = json_client.get("/event-categories")
+
+    assert response.json()["items"] == [{"id": 1, "name": "Other"}]
+    assert json_client.request_counts == {"GET /event-categories": {"200": 1}}
+
+
+def test_put_not_found(db, seeder, create_json_client):
+    import pytest
+
+    from project.json_client import NotFoundError
+    from project.models import User
+
+    user = db.session.get(User, seeder.create_user())
+    json_client = create_json_client(user)
+
+    with pytest.raises(NotFoundError):
+        json_client.put("/events/1", {"name": "Name"})
+
+    assert json_client.request_counts == {"PUT /events/{id}": {"404": 1}}
+
+
+def test_session_pool_keeps_checked_out_sessions(
+    app, db, seeder, create_json_client, monkeypatch
+):
+    from project.json_client import session_pool
+    from project.models import User
+
+    user = db.session.get(User, seeder.create_user())
+    json_client = create_json_client(user)
+    pooled = json_client._pooled
+
+    # Every session that is not checked out is idle
+    monkeypatch.setitem(app.config, "EVENTCALLY_SESSION_IDLE_TIMEOUT", -1)
+    other_json_client = create_json_client(user)
+    assert other_json_client._pooled is pooled
+    assert pooled.checkouts == 2
+
+    json_client.close()
+    other_json_client.close()
+    assert pooled.checkouts == 0
+
+    create_json_client(user).close()
+    assert pooled not in session_pool._sessions.values()
@@ -0,0 +1,67 @@
+import datetime
+
+from dateutil import tz
+
+from project.recurrence import expand_recurrence_rule
+
+timezone = "Europe/Berlin"
+
+
+def test_expand_recurrence_rule_skips_past_occurrences():
+    rule = "RRULE:FREQ=DAILY\nRRULE:FREQ=DAILY;BYHOUR=18"
+    today = datetime.date.today()
+
+    date_definitions, changes_at = expand_recurrence_rule(
+        rule,
+        "2015-01-01 10:00:00+01:00",
+        "2015-01-01 11:00:00+01:00",
+        False,
+        timezone,
+        100,
+        365,
+    )
+
+    assert len(date_definitions) == 100
+    first_start = datetime.date.fromisoformat(date_definitions[0]["start"][:10])
+    assert first_start >= today
+    assert changes_at > datetime.datetime.now(tz.UTC)
+
+
+def test_expand_recurrence_rule_window_start():
+    rule = "RRULE:FREQ=WEEKLY\nRRULE:FREQ=WEEKLY;BYDAY=FR"
+    window_start = datetime.datetime.now(tz.UTC) - datetime.timedelta(days=30)
+
+    date_definitions, _ = expand_recurrence_rule(
+        rule, "2015-01-01", None, True, timezone, 100, 7, window_start
+    )
+
+    starts = [datetime.date.fromisoformat(d["start"]) for d in date_definitions]
+    assert starts
+    assert min(starts) >= window_start.date()
+    assert min(starts) < datetime.date.today()
+    assert max(starts) <= datetime.date.today() + datetime.timedelta(days=7)
+
+
+def test_expand_recurrence_rule_horizon_change():
+    start = datetime.datetime.now(tz.gettz(timezone)).replace(microsecond=0)
+    start += datetime.timedelta(days=10)
+    rule = "RRULE:FREQ=MONTHLY;COUNT=2\nRRULE:FREQ=YEARLY;COUNT=2"
+
+    date_definitions, changes_at = expand_recurrence_rule(
+        rule, start.isoformat(), None, False, timezone, 100, 35
+    )
+
+    # The second monthly occurrence reaches the horizon before the first ends
+    assert len(date_definitions) == 1
+    assert changes_at < start - datetime.timedelta(days=3)
+
+
+def test_expand_recurrence_rule_without_occurrences():
+    rule = "RRULE:FREQ=DAILY;COUNT=3\nRRULE:FREQ=WEEKLY;COUNT=2"
+
+    date_definitions, changes_at = expand_recurrence_rule(
+        rule, "2015-01-01 10:00:00", None, False, timezone, 100, 365
+    )
+
+    assert date_definitions == []
+    assert changes_at is None
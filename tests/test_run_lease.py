@@ -0,0 +1,85 @@
+def test_claim(app, redis):
+    from project.run_lease import RunLease
+
+    lease = RunLease(1)
+    assert lease.claim("task1")
+    assert lease.holder_task_id is None
+    assert redis.get(lease.key) == b"queued:task1"
+    assert 0 < redis.ttl(lease.key) <= app.config["RUN_LEASE_QUEUE_TTL"]
+
+    other = RunLease(1)
+    assert not other.claim("task2")
+    assert other.holder_task_id == "task1"
+    assert other.get_task_id() == "task1"
+    assert redis.get(lease.key) == b"queued:task1"
+
+    assert RunLease(2).claim("task2")
+
+
+def test_acquire_and_release(app, redis):
+    from project.run_lease import RunLease
+
+    assert RunLease(1).claim("task1")
+
+    # Another task is dropped while the configuration is claimed
+    assert not RunLease(1).acquire("task2")
+
+    lease = RunLease(1)
+    assert lease.acquire("task1")
+    assert redis.get(lease.key).startswith(b"running:task1:")
+    assert RunLease(1).get_task_id() == "task1"
+
+    # A redelivered copy of the running task must not take over the lease
+    redelivered = RunLease(1)
+    assert not redelivered.acquire("task1")
+    assert not RunLease(1).claim("task3")
+
+    # Releasing a lease that was not acquired keeps the running lease
+    redelivered.release()
+    assert redis.get(lease.key) == lease.value.encode()
+
+    lease.release()
+    assert redis.get(lease.key) is None
+    assert lease.value is None
+
+    # A task that is redelivered after the run ended may run again
+    assert redelivered.acquire("task1")
+    redelivered.release()
+
+
+def test_acquire_without_claim(app, redis):
+    from project.run_lease import RunLease
+
+    lease = RunLease(1)
+    assert lease.acquire("task1")
+    assert not RunLease(1).acquire("task2")
+    lease.release()
+    assert redis.get(lease.key) is None
+
+
+def test_disabled_without_redis(app):
+    from project.run_lease import RunLease
+
+    lease = RunLease(1)
+    assert lease.claim("task1")
+    assert RunLease(1).claim("task2")
+    assert lease.acquire("task1")
+    assert lease.get_task_id() is None
+    lease.release()
+
+
+def test_perform_run_task_drops_duplicate(db, seeder, redis):
+    from project.celery_tasks import perform_run_task
+    from project.models import Run
+    from project.run_lease import RunLease
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(user_id, "http://localhost")
+    lease = RunLease(configuration_id)
+    assert lease.acquire("task1")
+
+    perform_run_task.apply((configuration_id,), task_id="task2")
+
+    assert Run.query.count() == 0
+    assert redis.get(lease.key) == lease.value.encode()
+    lease.release()
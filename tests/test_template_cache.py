@@ -0,0 +1,37 @@
+import pytest
+
+standard = {"name": "Name\r\nwith CRLF\n", "none": None, "number": 1}
+
+
+@pytest.mark.parametrize(
+    "source, kind",
+    [
+        ('{{ standard["name"] }}', "passthrough"),
+        ("{{standard['name']}}\n", "passthrough"),
+        ('{{ standard["name"] }}\r\n', "passthrough"),
+        ('{{ standard["none"] }}', "passthrough"),
+        ('{{ standard["number"] }}', "passthrough"),
+        ('{{ standard["missing"] }}', "passthrough"),
+        ('{{ standard["name"] }}\n\n', "template"),
+        ('{{ standard["name"] | upper }}', "template"),
+        ("Constant", "constant"),
+        ("Constant\n", "constant"),
+        ("Line 1\r\nLine 2\r\n", "constant"),
+        ("Line 1\rLine 2\n\n", "constant"),
+        ("", "constant"),
+    ],
+)
+def test_mapping_template_renders_like_jinja(app, source, kind):
+    from jinja2 import BaseLoader, Environment
+
+    from project.template_cache import MappingTemplate
+
+    template = MappingTemplate(source)
+    expected = (
+        Environment(loader=BaseLoader())
+        .from_string(source)
+        .render(standard=standard, vevent=None)
+    )
+
+    assert template.kind == kind
+    assert template.render(standard, None) == expected
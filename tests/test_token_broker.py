@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def expired_user(db, seeder):
+    from project.models import User
+
+    user = db.session.get(User, seeder.create_user())
+    user.expires_at = int(time.time())
+    db.session.commit()
+    return user
+
+
+def test_refresh_stores_token_once(
+    db, expired_user, create_json_client, fake_eventcally, monkeypatch
+):
+    from project.token_broker import token_broker
+
+    stored_tokens = list()
+    store_token = token_broker.store_token
+
+    def store_token_spy(user_id, token):
+        stored_tokens.append(token)
+        store_token(user_id, token)
+
+    monkeypatch.setattr(token_broker, "store_token", store_token_spy)
+    json_client = create_json_client(expired_user)
+
+    json_client.ensure_active_token()
+    json_client.close()
+
+    assert fake_eventcally.calls[("token", "POST")] == 1
+    assert len(stored_tokens) == 1
+    db.session.refresh(expired_user)
+    assert expired_user.access_token == stored_tokens[0]["access_token"]
+    assert expired_user.refresh_token == stored_tokens[0]["refresh_token"]
+
+
+def test_reload_before_refresh(db, expired_user, create_json_client, fake_eventcally):
+    from project.token_broker import token_broker
+
+    json_client = create_json_client(expired_user)
+
+    # Another process refreshed the token in the meantime
+    token_broker.store_token(
+        expired_user.id,
+        {
+            "access_token": "other",
+            "refresh_token": "other",
+            "expires_at": int(time.time()) + 3600,
+        },
+    )
+
+    json_client.ensure_active_token()
+    json_client.close()
+
+    assert fake_eventcally.calls[("token", "POST")] == 0
+    assert json_client.session.token["access_token"] == "other"
+
+
+@pytest.mark.parametrize("use_redis", [False, True])
+def test_concurrent_refresh(
+    app, expired_user, create_json_client, fake_eventcally, request, use_redis
+):
+    from project.json_client import session_pool
+    from project.token_broker import token_broker
+
+    if use_redis:
+        request.getfixturevalue("redis")
+
+    oauth_client = create_json_client(expired_user).oauth_client
+    user_id = expired_user.id
+
+    # Sessions of different processes that hold the same expired token
+    sessions = [
+        session_pool._create_session(oauth_client, expired_user) for _ in range(3)
+    ]
+    fake_eventcally.latency = 0.2
+
+    def refresh(session):
+        with app.app_context():
+            token_broker.ensure_active_token(session, user_id)
+
+    threads = [threading.Thread(target=refresh, args=(s,)) for s in sessions]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert fake_eventcally.calls[("token", "POST")] == 1
+    assert len({s.token["access_token"] for s in sessions}) == 1
@@ -0,0 +1,143 @@
+import pytest
+
+
+def create_run_with_log_entries(db, seeder, count: int) -> tuple:
+    from project.models import LogEntry, Run
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(user_id, "http://localhost")
+    run = Run(configuration_id=configuration_id, status="success")
+
+    for i in range(count):
+        run.log_entries.append(LogEntry(message=f"Entry {i}", type="vevent"))
+
+    db.session.add(run)
+    db.session.commit()
+    return user_id, configuration_id, run.id
+
+
+def test_run_log_entries_limit(client, db, seeder):
+    user_id, configuration_id, run_id = create_run_with_log_entries(db, seeder, 3)
+    seeder.login(client, user_id)
+    url = f"/configurations/{configuration_id}/runs/{run_id}/log_entries"
+
+    response = client.get(url, query_string={"limit": -1})
+    assert response.status_code == 200
+    assert len(response.json["items"]) == 1
+    assert response.json["next"]
+
+    response = client.get(url, query_string={"limit": 2})
+    assert len(response.json["items"]) == 2
+
+    response = client.get(url, query_string={"after": response.json["next"]})
+    assert len(response.json["items"]) == 1
+    assert response.json["next"] is None
+
+
+@pytest.fixture
+def post_preview(client, db, seeder, fake_eventcally, monkeypatch):
+    from project import oauth
+
+    # The preview runs dry and never calls eventcally
+    monkeypatch.setattr(oauth.eventcally, "load_server_metadata", dict)
+    user_id = seeder.create_user()
+    url = f"{fake_eventcally.base_url}/feed.ics"
+    configuration_id = seeder.create_configuration(user_id, url)
+    seeder.login(client, user_id)
+
+    def post(**data):
+        return client.post(
+            f"/configurations/{configuration_id}/update/js/preview",
+            data={"url": url, "organization_id": "1", **data},
+        )
+
+    return post
+
+
+def test_preview(post_preview):
+    response = post_preview(preview_limit="5")
+    assert response.status_code == 200
+    assert response.json["status"] == "success"
+    assert response.json["event_count"] == 5
+    assert response.json["total_event_count"] == 84
+
+    log_entries = [e for e in response.json["log_entries"] if e["type"] == "vevent"]
+    assert len(log_entries) == 5
+    assert log_entries[0]["context"]["errors"] == []
+
+    response = post_preview(
+        preview_start="2024-02-01", preview_end="2024-02-29", preview_limit="100"
+    )
+    assert response.json["status"] == "success"
+    assert 0 < response.json["event_count"] < 84
+
+    response = post_preview(
+        preview_limit="5", name="{{ vevent.name | upper }}", changed_field="name"
+    )
+    context = response.json["log_entries"][0]["context"]
+    assert response.json["status"] == "success"
+    assert context["field"] == "name"
+    assert context["value"] == context["value"].upper()
+    assert "standard" not in context
+
+
+@pytest.mark.parametrize("preview_limit, event_count", [("0", 1), ("-5", 1), ("x", 25)])
+def test_preview_limit_is_clamped(post_preview, preview_limit, event_count):
+    response = post_preview(preview_limit=preview_limit)
+    assert response.status_code == 200
+    assert response.json["event_count"] == event_count
+
+
+def test_preview_invalid_window(post_preview):
+    response = post_preview(preview_start="2024-02-30", preview_end="tomorrow")
+    assert response.status_code == 400
+    assert b"preview_start" in response.data
+
+
+def test_update_save_validates_integers(client, db, seeder):
+    from project.models import Configuration
+
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(user_id, "http://localhost")
+    seeder.login(client, user_id)
+    url = f"/configurations/{configuration_id}/update/js/save"
+
+    response = client.put(url, data={"write_concurrency": "abc"})
+    assert response.status_code == 400
+
+    response = client.put(url, data={"write_concurrency": "0"})
+    assert response.status_code == 400
+    assert b"write_concurrency" in response.data
+
+    response = client.put(url, data={"run_retention_days": "-1"})
+    assert response.status_code == 400
+
+    response = client.put(
+        url, data={"write_concurrency": "8", "run_retention_days": ""}
+    )
+    assert response.status_code == 200
+
+    configuration = db.session.get(Configuration, configuration_id)
+    assert configuration.write_concurrency == 8
+    assert configuration.run_retention_days is None
+
+
+def test_import_attaches_to_running_run(client, db, seeder, redis, monkeypatch):
+    from project import oauth
+    from project.models import Run
+    from project.run_lease import RunLease
+
+    monkeypatch.setattr(oauth.eventcally, "load_server_metadata", dict)
+    monkeypatch.setattr(oauth.eventcally, "userinfo", lambda **kwargs: dict())
+    user_id = seeder.create_user()
+    configuration_id = seeder.create_configuration(user_id, "http://localhost")
+    seeder.login(client, user_id)
+    lease = RunLease(configuration_id)
+    assert lease.acquire("task1")
+
+    response = client.post(f"/configurations/{configuration_id}/update/js/import")
+
+    assert response.status_code == 200
+    assert response.json["id"] == "task1"
+    assert Run.query.count() == 0
+    lease.release()